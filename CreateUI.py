@@ -929,6 +929,7 @@ class SelectTrackAlgorithmSettings(UICreator):
         #Initialise the simulation
         #   **algorithm_settings_ui.get_settings() : gets the specific settings from the UI input fields
         simulation_obj.set_results_database(self.results_database)
+        simulation_obj.set_track_geometry(self.track_creator.track_geometry)
         simulation_obj.apply_algorithm_settings(algorithm_name, track_pieces, self.track_selection_ui.track_name, **algorithm_settings_ui.get_settings())
         simulation_obj.apply_physics_settings(**physics_settings_ui.get_settings())
         simulation_obj.initialise_simulation()
@@ -937,7 +938,7 @@ class SelectTrackAlgorithmSettings(UICreator):
         self.bgcol[0] = simulation_obj.main_settings["offroad-colour"]
 
 
-    def create_UI(self, physics_settings_layer, header_layer, astar_ui, genetic_ui, obstacle_ui, greedy_ui):
+    def create_UI(self, physics_settings_layer, header_layer, astar_ui, genetic_ui, obstacle_ui, greedy_ui, jps_ui):
         elements = self.elements
         win = self.surface
 
@@ -975,12 +976,21 @@ class SelectTrackAlgorithmSettings(UICreator):
         #"Greedy Best First" button
         _pos = ptc(23.72, 1.67)
         _size = ptc(3.9, 1.86)
-        _element = SelectionButton(win, _pos.x, _pos.y, _size.x, _size.y, self.set_algorithm, COLOURS["lightgrey"], COLOURS["grey"], self.buttons, args=(header_layer, greedy_ui, "AStar"))
+        _element = SelectionButton(win, _pos.x, _pos.y, _size.x, _size.y, self.set_algorithm, COLOURS["lightgrey"], COLOURS["grey"], self.buttons, args=(header_layer, greedy_ui, "Greedy"))
         _element.set_text("Greedy Best First")
         _fnt = pygame.font.SysFont("Comic Sans MS", _fnt_size)
         _element.set_font(_fnt, align="centre")
         elements.append(_element)
 
+        #"Jump Point Search" button
+        _pos = ptc(27.99, 1.67)
+        _size = ptc(3.9, 1.86)
+        _element = SelectionButton(win, _pos.x, _pos.y, _size.x, _size.y, self.set_algorithm, COLOURS["lightgrey"], COLOURS["grey"], self.buttons, args=(header_layer, jps_ui, "JPS"))
+        _element.set_text("Jump Point Search")
+        _fnt = pygame.font.SysFont("Comic Sans MS", _fnt_size)
+        _element.set_font(_fnt, align="centre")
+        elements.append(_element)
+
         #"Algorithms:" header
         _pos = ptc(7.33, 2.09)
         _size = ptc(3.57, 1.8)
@@ -1,4 +1,5 @@
 import math
+import heapq
 import numpy as np
 
 '''
@@ -502,9 +503,148 @@ class PriorityQueue2(Queue):
     def dequeue(self):
         return super().dequeue()[0]
 
+'''
+Heap queue
+Priority queue stored as a binary min-heap, the lowest priority is always at the front of the queue
+    enqueueing an item already in the queue with a lower priority replaces its priority (decrease-key)
+    replaced entries are left in the heap and skipped when they reach the front (lazy deletion)
+private attributes:
+    heap : list of [priority, count, item] entries ordered as a binary heap
+    entries : dictionary of each queued item to its current heap entry
+    count : number of entries pushed, used so equal priorities leave in the order they were added
+
+methods:
+    is_empty() : returns true/false depending on if the queue is empty
+    contains(item) : returns true/false depending on if the item is in the queue
+    enqueue(item, priority) : adds an item to the queue, or lowers the priority of a queued item
+    dequeue() : removes the lowest priority item from the queue, returning the item
+    head() : returns the lowest priority item, without removing the item
+    get_size() : returns the current number of items in the queue
+'''
+class HeapQueue:
+    def __init__(self):
+        self.__heap = []
+        self.__entries = {}
+        self.__count = 0
+
+    #Returns true if the queue is empty
+    def is_empty(self):
+        if len(self.__entries) == 0:
+            return True
+
+        return False
+
+    #Returns true if the item is in the queue
+    def contains(self, item):
+        return item in self.__entries
+
+    #Add an item to the queue with the given priority
+    #   items already in the queue keep the lowest of their priorities
+    def enqueue(self, item, priority):
+        if item in self.__entries:
+            entry = self.__entries[item]
+            if entry[0] <= priority:
+                return
+
+            entry[2] = None #Mark the old entry as removed
+
+        entry = [priority, self.__count, item]
+        self.__count += 1
+
+        self.__entries[item] = entry
+        heapq.heappush(self.__heap, entry)
+
+    #Remove the lowest priority item from the queue
+    #   raises an error if the queue is empty
+    #   returns the item removed
+    def dequeue(self):
+        self.__remove_deleted()
+        if self.is_empty():
+            raise Exception("Error. Cannot perfrom dequeue; queue is empty")
+
+        item = heapq.heappop(self.__heap)[2]
+        del self.__entries[item]
+        return item
+
+    #Returns the lowest priority item of the queue, without removing the item
+    def head(self):
+        self.__remove_deleted()
+        if self.is_empty():
+            raise Exception("Error. Cannot perform head; queue is empty")
+
+        return self.__heap[0][2]
+
+    #Returns the number of items in the queue
+    def get_size(self):
+        return len(self.__entries)
+
+    #Pop removed entries from the front of the heap
+    def __remove_deleted(self):
+        while len(self.__heap) > 0 and self.__heap[0][2] is None:
+            heapq.heappop(self.__heap)
+
+    def __repr__(self):
+        return f"HeapQueue: {sorted(self.__entries.values())}"
+
+'''
+Node grid
+Stores items in square cells keyed by their integer cell coordinates, used to find nearby items without checking every item
+    cells are stored in a dictionary, so only occupied cells use memory and negative coordinates are valid
+private attributes:
+    cell_size : width and height of each cell
+    cells : dictionary of (cell x, cell y) to the list of items in the cell
+
+methods:
+    get_cell_pos(pos) : returns the cell coordinates containing the position
+    add(item, pos) : adds an item at the given position
+    get_cell(cell_x, cell_y) : returns the list of items in a cell
+    get_nearby(pos, radius) : returns the items in every cell overlapping the square of the given radius around the position
+    get_size() : returns the number of occupied cells
+'''
+class NodeGrid:
+    def __init__(self, cell_size):
+        self.__cell_size = cell_size
+        self.__cells = {}
+
+    #Returns the (x, y) coordinates of the cell containing the position
+    #   floor is used (not int) so negative positions are in the correct cell
+    def get_cell_pos(self, pos):
+        return (math.floor(pos.x / self.__cell_size), math.floor(pos.y / self.__cell_size))
+
+    #Add an item to the cell containing the position
+    def add(self, item, pos):
+        cell_pos = self.get_cell_pos(pos)
+
+        if cell_pos not in self.__cells:
+            self.__cells[cell_pos] = []
+
+        self.__cells[cell_pos].append(item)
+
+    #Returns the list of items in the cell, empty cells return an empty list
+    def get_cell(self, cell_x, cell_y):
+        return self.__cells.get((cell_x, cell_y), [])
+
+    #Returns every item in the cells overlapping the square around the position
+    #   items may be further than radius away, so the caller should check the distance
+    def get_nearby(self, pos, radius):
+        min_x, min_y = self.get_cell_pos(pos - Vector(radius, radius))
+        max_x, max_y = self.get_cell_pos(pos + Vector(radius, radius))
+
+        nearby = []
+        for cell_x in range(min_x, max_x+1):
+            for cell_y in range(min_y, max_y+1):
+                nearby.extend(self.get_cell(cell_x, cell_y))
+
+        return nearby
+
+    #Returns the number of occupied cells
+    def get_size(self):
+        return len(self.__cells)
+
 '''
 Network class
 Used to forward pass a set of data through a neural network
+    every weight and bias is stored in one flat "genome" array, the weights and biases are views into it
 
 Parameters:
     sequence : array of the node counts for each layer
@@ -512,33 +652,50 @@ Parameters:
     weights : the weights the network should use
     biases : the biases the network should use
     gen_new : generate the network with random numbers using the given sequence
+    genome : optional 1D array of length genome_length(sequence) the network should use as its buffer
+        e.g a row of a population's genome matrix, the network reads and writes it in place
 '''
 class Network:
 
-    def __init__(self, sequence, weights=[], biases=[], gen_new=True):
-        self.weights = weights.copy()
-        self.biases = biases.copy()
+    def __init__(self, sequence, weights=[], biases=[], gen_new=True, genome=None):
         self.sequence = sequence
 
+        #Create the buffer and the weights/biases views into it
+        if genome is None:
+            genome = np.zeros(genome_length(sequence))
+        elif len(genome) != genome_length(sequence):
+            raise Exception("Error; genome length does not match network sequence")
+
+        self.genome = genome
+        self.weights = []
+        self.biases = []
+        for weight_slice, bias_slice, shape in genome_layout(sequence):
+            self.weights.append(self.genome[weight_slice].reshape(shape))
+            self.biases.append(self.genome[bias_slice].reshape(shape[0], 1))
+
         #Randomly generate network with given node counts for each layer
+        #   values from -0.5 to 0.5
         if gen_new == True:
-            for layer_i in range(1, len(sequence)):
-                #Generate values from -5 to 5 (1 to 10 then subtract 5)
-                # self.weights.append(np.random.randint(10, size=(sequence[layer_i], sequence[layer_i-1])) - 5)
-                # self.biases.append(np.random.randint(10, size=(sequence[layer_i], 1)) - 5)
-                self.weights.append(np.random.rand(sequence[layer_i], sequence[layer_i-1]) - 0.5)
-                self.biases.append(np.random.rand(sequence[layer_i], 1) - 0.5)
+            self.genome[:] = np.random.rand(len(self.genome)) - 0.5
+        else:
+            self.set_network(weights, biases)
 
         self.activation = self.sigmoid_activation
-        self.activation_np = np.vectorize(self.activation)
+        self.activation_np = sigmoid
 
         #weights[layer_i][node_i][weight_i]
         #   this means the number of weights is the number of columns for each node and the number of previous nodes
 
     #Sets the weights and biases of the network
+    #   values are copied into the genome so the views stay valid
     def set_network(self, weights, biases):
-        self.weights = weights.copy()
-        self.biases = biases.copy()
+        for layer_i in range(0, len(weights)):
+            self.weights[layer_i][:] = weights[layer_i]
+            self.biases[layer_i][:] = biases[layer_i]
+
+    #Sets the network from a flat genome
+    def set_genome(self, genome):
+        self.genome[:] = genome
 
 
     #Forward an array of inputs through network
@@ -573,6 +730,112 @@ class Network:
 
         return out
 
+'''
+Network batch class
+Used to forward pass inputs through many networks of the same sequence at once
+    each layer's weights are 3D views into a genome matrix so a layer is one batched matrix multiplication
+
+Parameters:
+    sequence : array of the node counts for each layer, shared by every network
+    genomes : (networks x genome length) array, one genome for each network
+        the batch uses views into this array, so changes to the genomes are forwarded without re-creating the batch
+
+Methods:
+    forward(inp, indices) : forward an input for each selected network
+    choose(inp, indices) : returns the index of the greatest output of each selected network
+    choose_broadcast(inp, indices) : returns the action of each selected network, the way a vehicle's own network chooses it
+'''
+class NetworkBatch:
+    def __init__(self, sequence, genomes):
+        self.sequence = sequence
+        self.genomes = genomes
+
+        if genomes.shape[1] != genome_length(sequence):
+            raise Exception("Error; genome length does not match network sequence")
+
+        #weights[layer_i][network_i] is the weights matrix of the network's layer
+        #   biases are stored as rows so they broadcast over the batch
+        self.weights = []
+        self.biases = []
+        for weight_slice, bias_slice, shape in genome_layout(sequence):
+            self.weights.append(genomes[:, weight_slice].reshape(len(genomes), *shape))
+            self.biases.append(genomes[:, bias_slice])
+
+    #Forward the inputs through the networks
+    #   inp : (networks x input nodes) array, one row for each selected network
+    #   indices : the index of the network each row is passed through, all networks when None
+    #returns a (networks x output nodes) array
+    def forward(self, inp, indices=None):
+        output = np.asarray(inp, dtype=float)
+
+        for weights, biases in zip(self.weights, self.biases):
+            if indices is not None:
+                weights = weights[indices]
+                biases = biases[indices]
+
+            #batched matrix multiplication of each weights matrix * output column
+            output = np.matmul(weights, output[:, :, None])[:, :, 0] + biases
+            output = sigmoid(output)
+
+        return output
+
+    #Returns the index of the greatest output node for each network
+    def choose(self, inp, indices=None):
+        return np.argmax(self.forward(inp, indices), axis=1)
+
+    #Returns the action of each network, the same as a vehicle forwarding its ray distances through its own network
+    #   vehicles pass their inputs as a 1D array, so the first layer's outputs broadcast against its bias column
+    #   every layer after that is a (nodes x first layer nodes) matrix, the action is the index of its greatest value
+    #   e.g. the [3, 4, 4, 2] vehicle network has 8 actions
+    #   inp : (networks x input nodes) array, one row for each selected network
+    #   indices : the index of the network each row is passed through, all networks when None
+    def choose_broadcast(self, inp, indices=None):
+        output = np.asarray(inp, dtype=float)
+
+        for weights, biases in zip(self.weights, self.biases):
+            if indices is not None:
+                weights = weights[indices]
+                biases = biases[indices]
+
+            #First layer, the outputs are a row and the biases a column
+            if output.ndim == 2:
+                output = np.matmul(weights, output[:, :, None])[:, None, :, 0] + biases[:, :, None]
+            else:
+                output = np.matmul(weights, output) + biases[:, :, None]
+            output = sigmoid(output)
+
+        return np.argmax(output.reshape(len(output), -1), axis=1)
+
+#sigmoid function for numpy arrays
+#   1 / 1 + e^-x
+#   written as e^-log(1 + e^-x) so large inputs do not overflow
+def sigmoid(inp):
+    return np.exp(-np.logaddexp(0, -inp))
+
+#Returns the number of weights and biases in a network of the given sequence
+def genome_length(sequence):
+    length = 0
+    for layer_i in range(1, len(sequence)):
+        length += sequence[layer_i] * (sequence[layer_i-1] + 1)
+
+    return length
+
+#Returns where each layer of a network is stored in its genome
+#   each layer is stored as its weights (row by row) followed by its biases
+#returns a list of (weight slice, bias slice, weights shape) for each layer
+def genome_layout(sequence):
+    layout = []
+    start = 0
+    for layer_i in range(1, len(sequence)):
+        shape = (sequence[layer_i], sequence[layer_i-1])
+        weight_end = start + shape[0]*shape[1]
+        bias_end = weight_end + shape[0]
+
+        layout.append((slice(start, weight_end), slice(weight_end, bias_end), shape))
+        start = bias_end
+
+    return layout
+
 
 if __name__ == "__main__":
     p1 = Vector(3, 3)
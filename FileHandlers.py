@@ -1,6 +1,12 @@
 from os.path import splitext, isfile
+import os
 import sqlite3
 import pickle
+import hashlib
+
+#Version of the layout of cached track data, part of every cache key
+#   increase this whenever the data stored in the track cache changes, so files stored in an older layout are never loaded
+CACHE_VERSION = 1
 
 '''
 External File class
@@ -367,6 +373,58 @@ class TextFile(ExternalFile):
 
         return output
 
+'''
+Track cache class
+Stores data created from a track on disk so it is only created once for each track
+    each item is stored in its own file, named by a hash of the cache version, the track structure, the kind of data, and the settings used to create it
+    changing the track changes the hash, so data of an old version of a track is never used
+    found paths and distance fields are cached this way
+
+Parameters:
+    cache_dir : the folder directory to store the cached data in (include "/" on the end of string)
+
+Methods:
+    get_key(track_pieces, kind, *settings) : returns the cache key of an item
+    load(key, keys) : returns the cached data, or None if the item has not been cached or is in an older layout
+    save(key, data) : stores the data under the key
+'''
+class TrackCache:
+    def __init__(self, cache_dir="./track_cache/"):
+        self.cache_dir = cache_dir
+
+    #Returns the cache key of an item
+    #   track_pieces : the list of track pieces the item is created from
+    #   kind : name of the kind of data, e.g. "Path" or "Distance field"
+    #   settings : the settings the item was created with, e.g. start position, node size and algorithm of a path
+    def get_key(self, track_pieces, kind, *settings):
+        #Serialise the track's structure, the same information a track file stores for each piece
+        structure = [(type(piece).__name__, piece._pos.get_pos(), piece.direction) for piece in track_pieces]
+        serialised = pickle.dumps([CACHE_VERSION, structure, kind, settings])
+
+        return hashlib.sha1(serialised).hexdigest()
+
+    #Returns the data stored under the key
+    #   returns None if there is no data, or the file cannot be read
+    #   keys : the dictionary keys the data must have, data missing any of them is in an older layout and is not used
+    def load(self, key, keys=()):
+        if isfile(self.cache_dir + key + ".txt") == False:
+            return None
+
+        #Files of an older layout can refer to classes which no longer exist, or be missing keys
+        try:
+            data = TextFile(key + ".txt", self.cache_dir).read_serialised()
+            for data_key in keys:
+                data[data_key]
+        except (pickle.UnpicklingError, EOFError, KeyError, AttributeError, TypeError):
+            return None
+
+        return data
+
+    #Store the data under the key
+    def save(self, key, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        TextFile(key + ".txt", self.cache_dir).write_serialised(data)
+
 if __name__ == "__main__":
     test_file = TextFile("TestFile.txt", "./output/")
     print(test_file.read_serialised())
@@ -0,0 +1,319 @@
+import Simulation as si
+import TrackCreator as tc
+from UIElements import Layer
+from CustomStructures import PriorityQueue
+import multiprocessing
+import argparse
+import math
+import time
+
+#Default settings used when none are given
+#   these match the defaults of the select track settings menus
+PHYSICS_SETTINGS = {
+    "maximum-velocity" : 300,
+    "acceleration-magnitude" : 600,
+    "deceleration-magnitude" : 90,
+    "turn-velocity" : 3.141/2,
+    "vehicle-width" : 25,
+    "vehicle-height" : 12,
+    "elasticity" : 100,
+    "friction" : 100,
+}
+
+ALGORITHM_SETTINGS = {
+    "Astar" : {"population-size" : 1, "follow-strength" : 100},
+    "JPS" : {"population-size" : 1, "follow-strength" : 100},
+    "Greedy" : {"population-size" : 1, "follow-strength" : 100},
+    "Genetic" : {"population-size" : 20, "mutation-rate" : 100, "mutation-chance" : 80, "existing-network" : ""},
+    "Obstacle Avoidance" : {"population-size" : 1, "follow-strength" : 100},
+}
+
+'''
+Headless simulation class
+Runs a simulation without a display surface, camera, or layer tree
+    vehicles are stepped as fast as the CPU allows and are never drawn
+
+Parameters:
+    fps : the simulation frame rate, used to convert steps into simulation time
+
+Methods:
+    load_track(file_name, file_dir) : loads the track and returns its track pieces
+    step() : updates every vehicle and the population once
+    run(generations, duration) : steps the simulation until a limit is reached, returns run statistics
+'''
+class HeadlessSimulation(si.Simulation):
+    def __init__(self, fps=60):
+        #Layers are only used as containers, they are never updated or drawn
+        super().__init__(None, None, Layer("headless simulation"))
+
+        self.track_creator = tc.TrackCreator(None, None, Layer("headless track creator"), self, "")
+        self.frame_period = 1 / fps
+        self.vehicles = [] #Vehicles stepped each frame
+        self.events = [] #No pygame events are passed headless
+        self.step_count = 0
+        self.sim_time = 0
+
+    #Loads the track from the given text file
+    #   file_name : name of the track file (including extension)
+    #   file_dir : folder directory to the track file
+    #returns the list of track pieces
+    def load_track(self, file_name, file_dir):
+        self.track_creator.load_track(file_name, file_dir)
+        self.set_track_geometry(self.track_creator.track_geometry)
+        return self.track_creator.track_pieces.get_list()
+
+    #Initialises the simulation
+    #   the vehicle list is copied (like the layer does) so re-ordering in the population does not step a vehicle twice
+    def initialise_simulation(self):
+        super().initialise_simulation()
+
+        self.vehicles = self.population.vehicles.copy()
+        self.step_count = 0
+        self.sim_time = 0
+
+    #Update every vehicle then the population, without any drawing
+    def step(self):
+        for vehicle in self.vehicles:
+            vehicle.update(self.events)
+
+        self.population.update(self.events)
+
+        self.step_count += 1
+        self.sim_time += self.frame_period
+
+    #Returns if any vehicle in the simulation is still active
+    def has_alive_vehicles(self):
+        for vehicle in self.population.vehicles:
+            if vehicle.alive == True:
+                return True
+
+        return False
+
+    #Step the simulation until a limit is reached
+    #   generations : number of generations to run (genetic algorithm only)
+    #   duration : seconds of simulation time to run
+    #non-genetic simulations also stop once every vehicle has finished
+    #returns a dictionary of the run statistics
+    def run(self, generations=None, duration=None):
+        if generations == None and duration == None:
+            raise Exception("Error; a generation or duration limit must be given")
+
+        if generations != None and self.algorithm != "Genetic":
+            raise Exception(f"Error; generation limit is invalid for algorithm '{self.algorithm}'")
+
+        start_time = time.time()
+        start_step = self.step_count
+
+        while True:
+            if duration != None and self.sim_time >= duration:
+                break
+
+            if generations != None:
+                if self.population.generation_number >= generations:
+                    break
+            elif self.algorithm != "Genetic" and self.has_alive_vehicles() == False:
+                break
+
+            self.step()
+
+        real_time = time.time() - start_time
+        steps = self.step_count - start_step
+
+        stats = {
+            "steps" : steps,
+            "sim-time" : self.sim_time,
+            "real-time" : real_time,
+            "steps-per-second" : steps / real_time if real_time > 0 else 0,
+        }
+
+        return stats
+
+    #Evaluate a set of genetic algorithm genomes for one generation
+    #   genomes : (vehicles x genome length) array, at most the population size
+    #   duration : seconds of simulation time before surviving vehicles are killed
+    #returns a list of (fitness, results) for each genome
+    def evaluate_genomes(self, genomes, duration):
+        population = self.population
+        population.fitnesses = PriorityQueue(population.population_size)
+        population.clock = 0
+
+        #Give each genome to a vehicle, vehicles without a genome are not simulated
+        for vehicle_i, vehicle in enumerate(population.vehicles):
+            if vehicle_i < len(genomes):
+                vehicle.brain.set_genome(genomes[vehicle_i])
+                vehicle.reset_vehicle(*population._pos.get_pos())
+            else:
+                vehicle.alive = False
+
+        population.cast_rays()
+        population.forward_brains()
+
+        #Step until the generation would be reset, like the population's clock does
+        while population.clock < duration and self.has_alive_vehicles() == True:
+            self.step()
+
+        evaluated = []
+        for vehicle in population.vehicles[:len(genomes)]:
+            if vehicle.alive == True:
+                vehicle.kill()
+
+            evaluated.append((vehicle.fitness, vehicle.results))
+
+        return evaluated
+
+
+#Headless simulation of the worker process, created once by "_init_worker"
+_worker_simulation = None
+
+#Create the worker process's simulation
+#   the track is rebuilt from its structure so the track geometry is only built once per worker
+def _init_worker(track_structure, track_name, algorithm_settings, physics_settings, distance_field_resolution, ray_sensor):
+    global _worker_simulation
+
+    _worker_simulation = HeadlessSimulation()
+    _worker_simulation.track_creator.set_structure(track_structure)
+    _worker_simulation.set_track_geometry(_worker_simulation.track_creator.track_geometry)
+    _worker_simulation.set_distance_field_resolution(distance_field_resolution)
+    _worker_simulation.set_ray_sensor(ray_sensor)
+    track_pieces = _worker_simulation.track_creator.track_pieces.get_list()
+
+    _worker_simulation.apply_algorithm_settings("Genetic", track_pieces, track_name, **algorithm_settings)
+    _worker_simulation.apply_physics_settings(**physics_settings)
+    _worker_simulation.initialise_simulation()
+
+    #Generations are ended by "evaluate_genomes", not the population
+    _worker_simulation.population.generation_duration = math.inf
+
+#Evaluate genomes in the worker process
+def _evaluate_genomes(genomes, duration):
+    return _worker_simulation.evaluate_genomes(genomes, duration)
+
+
+'''
+Parallel genetic simulation class
+Runs a genetic algorithm simulation with each generation evaluated by a pool of headless worker processes
+    the population is split into a shard for each worker, workers run their vehicles until they die or the generation ends
+    fitnesses and results are returned to this simulation, which then resets the generation
+
+Parameters:
+    processes : number of worker processes, defaults to the CPU count
+    fps : the simulation frame rate, used to convert steps into simulation time
+
+Methods:
+    run_generation() : evaluates the current generation and creates the next one
+    run(generations) : runs the given number of generations, returns run statistics
+    close() : stops the worker processes
+'''
+class ParallelGeneticSimulation(HeadlessSimulation):
+    def __init__(self, processes=None, fps=60):
+        super().__init__(fps)
+
+        self.processes = processes if processes != None else multiprocessing.cpu_count()
+        self.pool = None
+
+    #Initialises the simulation and starts the worker processes
+    #   each worker has a population large enough for one shard
+    def initialise_simulation(self):
+        if self.algorithm != "Genetic":
+            raise Exception(f"Error; Invalid algorithm '{self.algorithm}' for parallel simulation")
+
+        super().initialise_simulation()
+        self.close()
+
+        shard_size = math.ceil(self.population.population_size / self.processes)
+        worker_settings = self.algorithm_settings.copy()
+        worker_settings["population-size"] = shard_size
+        worker_settings["existing-network"] = ""
+
+        self.pool = multiprocessing.Pool(
+            min(self.processes, self.population.population_size),
+            initializer=_init_worker,
+            initargs=(self.track_creator.track_structure.get_list(), self.track_name, worker_settings, self.physics_settings, self.distance_field_resolution, self.ray_sensor))
+
+    #Evaluate the current generation in the worker processes, then create the next generation
+    def run_generation(self):
+        population = self.population
+        duration = population.generation_duration + population.best_fitness / 10
+
+        #Split the vehicles into a shard for each worker
+        shard_size = math.ceil(population.population_size / self.processes)
+        shards = [population.vehicles[i:i+shard_size] for i in range(0, population.population_size, shard_size)]
+        jobs = [(population.genomes[[vehicle.index for vehicle in shard]], duration) for shard in shards]
+
+        for shard, evaluated in zip(shards, self.pool.starmap(_evaluate_genomes, jobs)):
+            for vehicle, (fitness, results) in zip(shard, evaluated):
+                vehicle.alive = False
+                vehicle.fitness = fitness
+                population.physics.set_results(vehicle.index, results)
+                population.add_fitness(vehicle, fitness)
+
+        population.reset_generation()
+
+        self.step_count += math.ceil(duration / self.frame_period)
+        self.sim_time += duration
+
+    #Run the given number of generations
+    #returns a dictionary of the run statistics
+    def run(self, generations=None, duration=None):
+        if generations == None or duration != None:
+            raise Exception("Error; parallel simulations only support a generation limit")
+
+        start_time = time.time()
+        start_generation = self.population.generation_number
+
+        while self.population.generation_number < generations:
+            self.run_generation()
+
+        real_time = time.time() - start_time
+        generation_count = self.population.generation_number - start_generation
+
+        stats = {
+            "generations" : generation_count,
+            "sim-time" : self.sim_time,
+            "real-time" : real_time,
+            "generations-per-second" : generation_count / real_time if real_time > 0 else 0,
+        }
+
+        return stats
+
+    #Stop the worker processes
+    def close(self):
+        if self.pool != None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a simulation without a display")
+    parser.add_argument("track", help="name of the track file (without extension)")
+    parser.add_argument("algorithm", choices=ALGORITHM_SETTINGS.keys())
+    parser.add_argument("--track-dir", default="./tracks/")
+    parser.add_argument("--generations", type=int, default=None)
+    parser.add_argument("--duration", type=float, default=None, help="seconds of simulation time")
+    parser.add_argument("--population-size", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None, help="evaluate genetic generations in this many worker processes")
+    parser.add_argument("--distance-field", type=float, default=None, help="use a signed distance field of the track with this resolution (pixels)")
+    parser.add_argument("--ray-sensor", choices=["segments", "distance field"], default="segments", help="how vehicle rays are cast, the distance field sensor needs --distance-field")
+    args = parser.parse_args()
+
+    algorithm_settings = ALGORITHM_SETTINGS[args.algorithm].copy()
+    if args.population_size != None:
+        algorithm_settings["population-size"] = args.population_size
+
+    if args.processes != None:
+        simulation = ParallelGeneticSimulation(args.processes)
+    else:
+        simulation = HeadlessSimulation()
+
+    track_pieces = simulation.load_track(args.track + ".txt", args.track_dir)
+    simulation.set_distance_field_resolution(args.distance_field)
+    simulation.set_ray_sensor(args.ray_sensor)
+    simulation.apply_algorithm_settings(args.algorithm, track_pieces, args.track, **algorithm_settings)
+    simulation.apply_physics_settings(**PHYSICS_SETTINGS)
+    simulation.initialise_simulation()
+
+    print(simulation.run(generations=args.generations, duration=args.duration))
+
+    if args.processes != None:
+        simulation.close()
@@ -191,9 +191,19 @@ greedy_algorithm_settings = AlgorithmSettingsGreedy(win, algorithm_settings_gree
 greedy_algorithm_settings.create_UI()
 greedy_algorithm_settings.commit()
 
+#Jump point search settings
+#   jump point search uses the same settings as A*
+algorithm_settings_jps_layer = Layer("algorithm settings jps")
+algorithm_settings_jps_layer.set_visibility(False)
+algorithm_settings_header_layer.add_child(algorithm_settings_jps_layer)
+
+jps_settings = AlgorithmSettingsAstar(win, algorithm_settings_jps_layer)
+jps_settings.create_UI()
+jps_settings.commit()
+
 
 algorithm_settings = SelectTrackAlgorithmSettings(win, algorithm_settings_layer, simulation_object, root_layer, select_track_select, track_creator_object, bgcol, physics_settings)
-algorithm_settings.create_UI("select track physics settings", algorithm_settings_header_layer, astar_settings, genetic_algorithm_settings, obstacle_avoidance_settings, greedy_algorithm_settings)
+algorithm_settings.create_UI("select track physics settings", algorithm_settings_header_layer, astar_settings, genetic_algorithm_settings, obstacle_avoidance_settings, greedy_algorithm_settings, jps_settings)
 algorithm_settings.commit()
 
 select_track_layer.add_child(algorithm_settings_layer)
@@ -0,0 +1,286 @@
+import numpy as np
+
+'''
+Path following functions
+Used by path finding populations to query the smoothed path with numpy arrays
+    the path is a chain of cubic beziers, each sharing its last control point with the next
+'''
+
+#Sample points along a chain of cubic beziers, matching "point_along_path" of the path finding populations
+#   control_points : list of (x, y) bezier control points
+#   segment_count : number of path segments, the path is sampled from t = 0 to t = segment_count
+#   samples_per_segment : number of samples for each whole step of t
+#points past the last complete bezier are the third last control point
+#returns a (samples x 2) array
+def sample_path(control_points, segment_count, samples_per_segment=10):
+    control_points = np.asarray(control_points, dtype=float).reshape(-1, 2)
+
+    t = np.arange(0, segment_count*samples_per_segment) / samples_per_segment
+    whole = t.astype(int)
+    fraction = (t % 1)[:, None]
+
+    #Beziers which have all four control points
+    complete = whole*3 + 4 <= len(control_points)
+    points = np.empty((len(t), 2))
+    if np.any(~complete):
+        points[~complete] = control_points[-3]
+
+    first = whole[complete]*3
+    fraction = fraction[complete]
+    p1 = control_points[first]
+    p2 = control_points[first+1]
+    p3 = control_points[first+2]
+    p4 = control_points[first+3]
+
+    #Generalised form of a cubic bezier
+    points[complete] = (-fraction**3 + 3*fraction**2 - 3*fraction + 1) * p1 + (3*fraction**3 - 6*fraction**2 + 3*fraction) * p2 + (-3*fraction**3 + 3*fraction**2) * p3 + (fraction**3) * p4
+
+    return points
+
+'''
+Path polyline class
+The smoothed path sampled once into a polyline, with the arc length to each sample
+    closest point queries project onto every polyline segment at once
+
+Parameters:
+    control_points : list of (x, y) bezier control points of the path
+    segment_count : number of path segments
+    samples_per_segment : number of polyline points for each path segment, higher values follow the curves closer
+
+Attributes:
+    points : (samples x 2) array of the polyline points
+    segment_starts : (samples-1 x 2) array of polyline segment start points
+    segment_directions : (samples-1 x 2) array of polyline segment directions (end - start)
+    arc_lengths : distance along the path to each polyline point
+    length : total length of the path
+    point_grid : uniform grid of the polyline points, used for batched queries
+
+Methods:
+    closest_point(point) : returns the closest point on the path and its arc length
+    closest_points(points) : returns the closest path point and arc length of each point
+    closest_point_near(point, arc_length, window) : returns the closest path point, only searching near the given arc length
+    nearest_points(points) : returns the closest path point and arc length of each point, using the point grid
+'''
+class PathPolyline:
+    def __init__(self, control_points, segment_count, samples_per_segment=10):
+        self.points = sample_path(control_points, segment_count, samples_per_segment)
+
+        #A single point is treated as a segment of length 0
+        if len(self.points) == 1:
+            self.points = np.repeat(self.points, 2, axis=0)
+
+        self.segment_starts = self.points[:-1]
+        self.segment_directions = self.points[1:] - self.points[:-1]
+
+        self._segment_lengths_sq = np.sum(self.segment_directions**2, axis=1)
+        _segment_lengths = np.sqrt(self._segment_lengths_sq)
+
+        self.arc_lengths = np.zeros(len(self.points))
+        self.arc_lengths[1:] = np.cumsum(_segment_lengths)
+        self.length = self.arc_lengths[-1] if len(self.points) > 0 else 0
+
+        self.point_grid = PathPointGrid(self.points)
+
+    #Returns the closest point on the path to the given point, and its arc length
+    #   point : (x, y) position
+    #returns (closest point as a (2,) array, arc length)
+    def closest_point(self, point):
+        closest, arc_lengths = self.closest_points(np.asarray(point, dtype=float).reshape(1, 2))
+        return closest[0], arc_lengths[0]
+
+    #Returns the closest point on the path to each point
+    #   points : (points x 2) array of positions
+    #   first, last : optional range of polyline segments to search, the whole path is searched by default
+    #returns ((points x 2) array of closest points, array of arc lengths)
+    def closest_points(self, points, first=0, last=None):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+
+        if len(self.segment_starts) == 0:
+            return np.zeros((len(points), 2)), np.zeros(len(points))
+
+        starts = self.segment_starts[first:last]
+        directions = self.segment_directions[first:last]
+        lengths_sq = self._segment_lengths_sq[first:last]
+
+        #Project each point onto each segment, clamped to the segment's ends
+        #   t = (point - start).direction / |direction|^2
+        offsets = points[:, None, :] - starts[None, :, :]
+        t = np.sum(offsets * directions[None, :, :], axis=2) / np.where(lengths_sq > 0, lengths_sq, 1)
+        t = np.clip(t, 0, 1)
+
+        projected = starts[None, :, :] + t[:, :, None] * directions[None, :, :]
+        distances_sq = np.sum((points[:, None, :] - projected)**2, axis=2)
+
+        #First closest segment of each point
+        segment_i = np.argmin(distances_sq, axis=1)
+        rows = np.arange(len(points))
+
+        closest = projected[rows, segment_i]
+        arc_lengths = self.arc_lengths[first:][segment_i] + t[rows, segment_i] * np.sqrt(lengths_sq[segment_i])
+
+        return closest, arc_lengths
+
+    #Returns the closest point on the path, searching only the part of the path near a previous result
+    #   point : (x, y) position
+    #   arc_length : arc length of the previous closest point, None searches the whole path
+    #   window : distance along the path either side of arc_length to search
+    #if the closest point is on the edge of the window, the path is likely closer outside it, so the whole path is searched
+    #returns (closest point as a (2,) array, arc length)
+    def closest_point_near(self, point, arc_length, window=100):
+        segment_count = len(self.segment_starts)
+        if arc_length == None or segment_count == 0:
+            return self.closest_point(point)
+
+        #Segments which overlap the window
+        first = max(int(np.searchsorted(self.arc_lengths, arc_length - window, side="right")) - 1, 0)
+        last = min(int(np.searchsorted(self.arc_lengths, arc_length + window, side="left")), segment_count)
+        last = max(last, first+1)
+
+        closest, arc_lengths = self.closest_points(np.asarray(point, dtype=float).reshape(1, 2), first, last)
+
+        #Closest point is at the edge of the window, but the path continues
+        if (first > 0 and arc_lengths[0] <= self.arc_lengths[first]) or (last < segment_count and arc_lengths[0] >= self.arc_lengths[last]):
+            return self.closest_point(point)
+
+        return closest[0], arc_lengths[0]
+
+    #Returns the closest point on the path to each point, in one query for every point
+    #   points : (points x 2) array of positions
+    #the nearest polyline point is found with the point grid, then the point is projected onto the segments either side of it
+    #returns ((points x 2) array of closest points, array of arc lengths)
+    def nearest_points(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        segment_count = len(self.segment_starts)
+
+        if segment_count == 0 or len(points) == 0:
+            return np.zeros((len(points), 2)), np.zeros(len(points))
+
+        nearest = self.point_grid.nearest(points)
+
+        #Project onto the segments before and after the nearest point
+        best_points = None
+        best_arc_lengths = None
+        best_distances = None
+        for segment_i in (np.maximum(nearest-1, 0), np.minimum(nearest, segment_count-1)):
+            starts = self.segment_starts[segment_i]
+            directions = self.segment_directions[segment_i]
+            lengths_sq = self._segment_lengths_sq[segment_i]
+
+            t = np.sum((points - starts) * directions, axis=1) / np.where(lengths_sq > 0, lengths_sq, 1)
+            t = np.clip(t, 0, 1)
+
+            projected = starts + t[:, None] * directions
+            distances = np.sum((points - projected)**2, axis=1)
+            arc_lengths = self.arc_lengths[segment_i] + t * np.sqrt(lengths_sq)
+
+            if best_points is None:
+                best_points, best_arc_lengths, best_distances = projected, arc_lengths, distances
+            else:
+                closer = distances < best_distances
+                best_points = np.where(closer[:, None], projected, best_points)
+                best_arc_lengths = np.where(closer, arc_lengths, best_arc_lengths)
+
+        return best_points, best_arc_lengths
+
+
+'''
+Path point grid class
+Uniform grid over a static set of points, used to find the nearest point to many query points at once
+    each query checks the square block of cells around it, any point outside the block is further away than the block's radius
+    queries without a point within the block's radius search a larger block, so results are always exact
+
+Parameters:
+    points : (points x 2) array of positions
+    cell_size : width and height of each cell (pixels)
+
+Methods:
+    nearest(queries) : returns the index of the nearest point to each query
+'''
+class PathPointGrid:
+    def __init__(self, points, cell_size=50):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.cell_size = cell_size
+
+        #Grid covers every point
+        if len(self.points) > 0:
+            self.origin = np.floor(self.points.min(axis=0) / cell_size) * cell_size
+            _far = np.floor(self.points.max(axis=0) / cell_size) * cell_size + cell_size
+        else:
+            self.origin = np.zeros(2)
+            _far = np.full(2, cell_size)
+        self.shape = ((_far - self.origin) / cell_size).round().astype(int) #(columns, rows)
+
+        #Sort the points by cell, points of cell i are cell_points[cell_starts[i]:cell_starts[i+1]]
+        cells = self._flat_cells(np.floor((self.points - self.origin) / cell_size).astype(int))
+        self.cell_points = np.argsort(cells, kind="stable")
+        self.cell_starts = np.zeros(self.shape[0]*self.shape[1] + 1, dtype=int)
+        self.cell_starts[1:] = np.cumsum(np.bincount(cells, minlength=self.shape[0]*self.shape[1]))
+
+    #Returns the flattened index of (column, row) cells
+    def _flat_cells(self, cells):
+        return cells[:, 0] * self.shape[1] + cells[:, 1]
+
+    #Returns the index of the nearest point to each query
+    #   queries : (queries x 2) array of positions
+    #the first point along the path is returned if several are equally near
+    def nearest(self, queries):
+        queries = np.asarray(queries, dtype=float).reshape(-1, 2)
+        nearest = np.zeros(len(queries), dtype=int)
+        nearest_sq = np.full(len(queries), np.inf)
+
+        if len(self.points) == 0:
+            return nearest
+
+        #Search blocks of cells around the queries, doubling the block radius for queries which are not resolved
+        unresolved = np.arange(len(queries))
+        radius = 1
+        while len(unresolved) > 0 and radius <= max(self.shape):
+            self._search_block(queries, unresolved, radius, nearest, nearest_sq)
+
+            #Points outside the block are at least "radius" cells away
+            unresolved = unresolved[~(nearest_sq[unresolved] <= (radius * self.cell_size)**2)]
+            radius *= 2
+
+        #Check every point for the remaining queries, far outside the grid
+        if len(unresolved) > 0:
+            distances_sq = np.sum((queries[unresolved, None, :] - self.points[None, :, :])**2, axis=2)
+            nearest[unresolved] = np.argmin(distances_sq, axis=1)
+
+        return nearest
+
+    #Find the nearest point in the block of cells around each query
+    #   query_indices : indices of the queries to search for
+    #   radius : number of cells either side of the query's cell
+    #nearest and nearest_sq are updated with the results
+    def _search_block(self, queries, query_indices, radius, nearest, nearest_sq):
+        cells = np.floor((queries[query_indices] - self.origin) / self.cell_size).astype(int)
+
+        #Every cell of each query's block, cells outside the grid are empty
+        _range = np.arange(-radius, radius+1)
+        offsets = np.stack(np.meshgrid(_range, _range, indexing="ij"), axis=2).reshape(-1, 2)
+        block_cells = (cells[:, None, :] + offsets[None, :, :]).reshape(-1, 2)
+        block_queries = np.repeat(query_indices, len(offsets))
+
+        inside = np.all((block_cells >= 0) & (block_cells < self.shape), axis=1)
+        block = self._flat_cells(np.where(inside[:, None], block_cells, 0))
+
+        #Pair each query with every point in its block
+        counts = np.where(inside, self.cell_starts[block+1] - self.cell_starts[block], 0)
+        pair_queries = np.repeat(block_queries, counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_points = self.cell_points[np.repeat(self.cell_starts[block], counts) + within]
+
+        if len(pair_points) == 0:
+            return
+
+        distances_sq = np.sum((queries[pair_queries] - self.points[pair_points])**2, axis=1)
+
+        #Pairs are grouped by query, so reduce each query's group of pairs
+        found, group_starts = np.unique(pair_queries, return_index=True)
+        group_sq = np.minimum.reduceat(distances_sq, group_starts)
+
+        #Lowest point index of the nearest points of each query
+        group_i = np.repeat(np.arange(len(found)), np.diff(np.append(group_starts, len(pair_queries))))
+        candidates = np.where(distances_sq == group_sq[group_i], pair_points, len(self.points))
+        nearest[found] = np.minimum.reduceat(candidates, group_starts)
+        nearest_sq[found] = group_sq
@@ -16,6 +16,9 @@ class Simulation:
         self.layer = layer
         self.algorithm = ""
         self.track_pieces = [] #Track which vehicles will follow
+        self.track_geometry = None #Precomputed geometry of the track pieces
+        self.distance_field_resolution = None #Resolution of the track's distance field, None does not use a distance field
+        self.ray_sensor = "segments" #How vehicle rays are cast, "segments" or "distance field"
         self.algorithm_settings = {} #Simulation settings
         self.physics_settings = {} #Physics settings
         self.main_settings = {}
@@ -42,7 +45,7 @@ class Simulation:
 
 
     #Apply the algorithm settings to the simulation
-    #   algorithm : string name of algorithm to use ("Astar", "Genetic", "Obstacle Avoidance")
+    #   algorithm : string name of algorithm to use ("Astar", "JPS", "Greedy", "Genetic", "Obstacle Avoidance")
     #   track_pieces : list of track pieces the vehicles should follow
     #   settings : the algorithm settings to apply to the vehicles (physics)
     def apply_algorithm_settings(self, algorithm, track_pieces, track_name, **settings):
@@ -54,7 +57,7 @@ class Simulation:
         #A* Algorithm choice
         if self._results_database == None:
             pass
-        elif self.algorithm == "Astar":
+        elif self.algorithm == "Astar" or self.algorithm == "JPS" or self.algorithm == "Greedy":
             self._results_database.add_entry("AStarTests", test_id=self._next_test, follow_strength=self.algorithm_settings["follow-strength"])
 
         #Genetic Algorithm choice
@@ -70,6 +73,26 @@ class Simulation:
             raise Exception(f"Error; Invalid algorithm '{self.algorithm}'")
 
 
+    #Set the precomputed geometry of the track
+    #   populations build their own geometry when this is not set
+    def set_track_geometry(self, track_geometry):
+        self.track_geometry = track_geometry
+
+    #Set the resolution of the track's signed distance field
+    #   vehicles use the distance field for on-track and collision checks instead of each piece's geometry
+    #   resolution : spacing between the field's grid points (pixels), None does not use a distance field
+    def set_distance_field_resolution(self, resolution):
+        self.distance_field_resolution = resolution
+
+    #Set how the rays of vehicles in a population are cast
+    #   ray_sensor : "segments" intersects rays with the sides of the track
+    #                "distance field" sphere traces rays through the track's distance field, a distance field resolution must be set
+    def set_ray_sensor(self, ray_sensor):
+        if ray_sensor not in ("segments", "distance field"):
+            raise Exception(f"Error; Invalid ray sensor '{ray_sensor}'")
+
+        self.ray_sensor = ray_sensor
+
     #Apply the physics settings to the simulation
     def apply_physics_settings(self, **settings):
         self.physics_settings = settings
@@ -129,7 +152,15 @@ class Simulation:
 
         #A* Algorithm choice
         if self.algorithm == "Astar":
-            self.population = so.PopulationAStar(1, self.surface, self.camera, self, 100, 0, self.track_pieces)
+            self.population = so.PopulationAStar(self.algorithm_settings["population-size"], self.surface, self.camera, self, 100, 0, self.track_pieces)
+
+        #Jump point search choice
+        elif self.algorithm == "JPS":
+            self.population = so.PopulationJPS(self.algorithm_settings["population-size"], self.surface, self.camera, self, 100, 0, self.track_pieces)
+
+        #Greedy best first search choice
+        elif self.algorithm == "Greedy":
+            self.population = so.PopulationGreedy(self.algorithm_settings["population-size"], self.surface, self.camera, self, 100, 0, self.track_pieces)
 
         #Genetic Algorithm choice
         elif self.algorithm == "Genetic":
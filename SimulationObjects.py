@@ -1,6 +1,9 @@
 from CustomStructures import *
 from StructureAlgorithms import bubble_sort
-from FileHandlers import TextFile
+from FileHandlers import TextFile, TrackCache
+from VehiclePhysics import VehiclePhysics
+from TrackGeometry import TrackGeometry, ray_directions
+from PathFollowing import PathPolyline
 import pygame
 import math
 import numpy as np
@@ -12,6 +15,32 @@ import time
 def draw_circle(inp, col, win, camera):
     pygame.draw.circle(win, col, camera.to_screen_pos(inp).get_pos(), 5)
 
+#Returns the bezier control points of a found path
+#   path_positions : (n, 2) array of the positions of each node along the path
+#every 4th node is used, up to the closest multiple of 4 (cubic beziers work with 4 nodes each)
+def get_control_points(path_positions):
+    return path_positions[0:4 * (len(path_positions)//4):4]
+
+#Retrace a path back to its start without recursion
+#   end_node : the last node of the path
+#   get_previous : function returning the node before a given node, or None for the start node
+#the path is walked once to find its length, then the positions are written into a preallocated array from the end
+#returns an (n, 2) array of the node positions from the start to the end node
+def retrace_positions(end_node, get_previous):
+    length = 0
+    node = end_node
+    while node != None:
+        length += 1
+        node = get_previous(node)
+
+    positions = np.empty((length, 2))
+    node = end_node
+    for node_i in range(length-1, -1, -1):
+        positions[node_i] = node._pos.get_pos()
+        node = get_previous(node)
+
+    return positions
+
 '''
 Simulation object class
 Every object in the simulation should inherit from this
@@ -161,11 +190,21 @@ class Camera(SimulationObject):
 
 '''
 Vehicle class
+The vehicle's state is held in a "VehiclePhysics" object, the vehicle reads and writes it through its slot index
+    vehicles in a population share the population's physics, so all vehicles are moved in one step
 
 population : the population which created the vehicle, can be left as "None"
+    vehicles without a population have physics of their own and move themselves in "update"
 '''
 class Vehicle(SimulationObject):
     def __init__(self, surface, camera, simulation_handler, xpos, ypos, fps, track_pieces, population):
+        #Physics slot must exist before the position and direction are set
+        if population != None:
+            self.physics = population.physics
+        else:
+            self.physics = VehiclePhysics(1)
+        self.index = self.physics.add_vehicle(xpos, ypos, 1 / fps, simulation_handler.physics_settings)
+
         width = simulation_handler.physics_settings["vehicle-width"]
         height = simulation_handler.physics_settings["vehicle-height"]
         super().__init__(surface, camera, simulation_handler, xpos, ypos, width=width, height=height)
@@ -180,111 +219,156 @@ class Vehicle(SimulationObject):
         self.frame_period = 1 / fps
         self.set_direction(0)
 
-        self.velocity = Vector(0, 0) 
         self.maximum_velocity = simulation_handler.physics_settings["maximum-velocity"] #Caps the velocity's magnitude to this value (pixels/second)
-        self.acceleration = Vector(0, 0) #pixels/second/second , applied when moving
-        self.acceleration_mag = simulation_handler.physics_settings["acceleration-magnitude"]
-        self.drag_factor = simulation_handler.physics_settings["deceleration-magnitude"]/100 #Drag for when not moving, values closer to 1 means quicker deacceleration
-        self.state_move = False #Set to true to move the vehicle
-
-        self.turn_state = "none" #"left", "none", "right" to control turn direction
         self.turn_speed = simulation_handler.physics_settings["turn-velocity"] #radian per second turn speed
 
         self.alive = True
-        self.tracks_crossed = []
-        self.results = {
-            "time-active" : 0, #Time spent active (incremented in update)
-            "distance-travelled" : 0, #Total distance (not displacement) travelled
-            "errors-made" : len(track_pieces), #How long spent off-road, distance from end
-        }
+        self.physics.errors_made[self.index] = len(track_pieces) - 1 #How long spent off-road, number of pieces not reached yet
+
+        #Track centreline used to follow the vehicle's progress, shared with the population
+        #   the population's distance field is used for on-track and collision checks when it has one
+        self.distance_field = None
+        if population != None:
+            self.track_geometry = population.track_geometry
+            self.distance_field = population.distance_field
+        elif simulation_handler.track_geometry != None and simulation_handler.track_geometry.track_pieces == list(track_pieces):
+            self.track_geometry = simulation_handler.track_geometry
+        else:
+            self.track_geometry = TrackGeometry(track_pieces)
+
+    #Position of the vehicle, stored in the physics arrays
+    @property
+    def _pos(self):
+        return Vector(*self.physics.pos[self.index].tolist())
+
+    @_pos.setter
+    def _pos(self, pos):
+        self.physics.pos[self.index] = pos.get_pos()
+
+    #Velocity of the vehicle (pixels/second)
+    @property
+    def velocity(self):
+        return Vector(*self.physics.velocity[self.index].tolist())
+
+    @velocity.setter
+    def velocity(self, velocity):
+        self.physics.velocity[self.index] = velocity.get_pos()
+
+    #Direction of the vehicle (radians)
+    @property
+    def direction(self):
+        return float(self.physics.direction[self.index])
+
+    @direction.setter
+    def direction(self, direction):
+        self.physics.direction[self.index] = direction
+
+    #"left", "none", "right" to control turn direction
+    @property
+    def turn_state(self):
+        return VehiclePhysics.TURN_NAMES[int(self.physics.turn_state[self.index])]
+
+    @turn_state.setter
+    def turn_state(self, turn_state):
+        self.physics.turn_state[self.index] = VehiclePhysics.TURN_STATES[turn_state]
+
+    #Set to true to move the vehicle
+    @property
+    def state_move(self):
+        return bool(self.physics.state_move[self.index])
+
+    @state_move.setter
+    def state_move(self, state_move):
+        self.physics.state_move[self.index] = state_move
+
+    @property
+    def alive(self):
+        return bool(self.physics.alive[self.index])
+
+    @alive.setter
+    def alive(self, alive):
+        self.physics.alive[self.index] = alive
+
+    #Track pieces the vehicle has reached, in the order they are driven
+    @property
+    def tracks_crossed(self):
+        return self.track_pieces[:int(self.physics.piece_index[self.index]) + 1]
+
+    #Distance along the track's centreline, found from the vehicle's current piece and position
+    @property
+    def progress(self):
+        return self.track_geometry.get_progress(int(self.physics.piece_index[self.index]), self.physics.pos[self.index].tolist())
+
+    #Results dictionary, a copy of the values in the physics arrays
+    @property
+    def results(self):
+        return self.physics.get_results(self.index)
     
     #Get the collected results from the vehicle
     def get_results(self):
         return self.results
 
     def reset_vehicle(self, xpos, ypos):
-        self.set_direction(0)
-        self.velocity = Vector(0, 0)
-        self.acceleration = Vector(0, 0)
-        self.state_move = False
-        self.turn_state = "none"
-        self._pos = Vector(xpos, ypos)
+        self.physics.reset_vehicle(self.index, xpos, ypos, len(self.track_pieces) - 1)
         self.draw_self = True
-        self.alive = True
-        self.results = {
-            "time-active" : 0,
-            "distance-travelled" : 0, 
-            "errors-made" : len(self.track_pieces),
-        }
 
     def kill(self):
         self.alive = False
+        self.physics.progress[self.index] = self.progress #Progress the vehicle reached, kept in its results
 
-    def update(self, events):
-        super().update(events)
-        #self.camera.set_pos(*self._pos.get_pos())
-
-        #TEMPORARY - Point towards the mouse cursor 
-        #   subtract pi / 2 to look towards the cursor
-        # mouse_pos = pygame.mouse.get_pos()
-        # self.set_direction(math.atan2(mouse_pos[0] - self._screen_pos.x, mouse_pos[1] - self._screen_pos.y) - math.pi/2)
-
-        # keys = pygame.key.get_pressed()
-        # if keys[pygame.K_SPACE]:
-        #     self.state_move = True
-        # else:
-        #     self.state_move = False
+    #Move the vehicle on to a track piece further along the track
+    #   every piece up to the given piece is counted as reached
+    #   piece_index : index of the piece in the track pieces
+    def reach_piece(self, piece_index):
+        _reached = piece_index - int(self.physics.piece_index[self.index])
 
-        if self.alive == True:
-            self.results["time-active"] += self.frame_period #time active in seconds (includes decimals)
-
-            #Check if crossed any track pieces
-            #   crossed if vehicle is closer than the size of the track
-            _inside_track = False
-            for track in self.track_pieces:
-                #If vehicle is inside a track piece
-                if track.collision_point(self._pos) == True:
-                    _inside_track = True
-
-                if track in self.tracks_crossed: continue
-
-                #Calculate distance from end
-                if (track._pos - self._pos).get_mag() <= track.size.get_mag():
-                    self.tracks_crossed.append(track)
-                    self.results["errors-made"] -= 1
-            
-            if _inside_track == False:
-                self.results["errors-made"] += self.frame_period #time outside track
+        if _reached > 0:
+            self.physics.piece_index[self.index] = piece_index
+            self.physics.errors_made[self.index] -= _reached
 
+    #Returns the array to store the vehicle's ray distances in
+    #   vehicles in a population use a row of the population's array so all rays can be cast at once
+    def create_ray_distances(self, ray_count, ray_length):
+        if self.population != None:
+            return self.population.get_ray_distances(self.index, ray_count, ray_length)
 
+        return np.full(ray_count, float(ray_length))
 
-            self.acceleration.x = self.acceleration_mag * math.cos(self.direction)
-            self.acceleration.y = -self.acceleration_mag * math.sin(self.direction)
+    def update(self, events):
+        super().update(events)
+        #self.camera.set_pos(*self._pos.get_pos())
 
-            #Apply velocity if allowed to move
-            if self.state_move == True:
+        if self.alive == True:
+            _pos = self._pos
+            _piece_index = int(self.physics.piece_index[self.index])
+
+            #Move onto a track piece further along once the vehicle is inside it
+            #   only the next two pieces are checked, pieces are reached in the order they are driven
+            #   the piece after next is checked first, so a vehicle which cuts across the next piece's corner still moves on
+            _reached = False
+            for _next_index in range(min(_piece_index + 2, len(self.track_pieces) - 1), _piece_index, -1):
+                if self.track_pieces[_next_index].collision_point(_pos) == True:
+                    self.reach_piece(_next_index)
+                    _reached = True
+                    break
 
-                #Apply and cap acceleration
-                if self.velocity.get_mag() < self.maximum_velocity:
-                    self.velocity += self.frame_period * self.acceleration
+            #Otherwise check the vehicle is still inside any track piece
+            #   the current piece is checked first, vehicles are usually inside it
+            if _reached == False:
+                if self.distance_field != None:
+                    _on_track = self.distance_field.is_inside(_pos.x, _pos.y)
+                elif self.track_pieces[_piece_index].collision_point(_pos) == True:
+                    _on_track = True
                 else:
-                    self.velocity = (self.maximum_velocity - 1) * self.velocity.normalised()
-            else:
+                    _on_track = self.track_geometry.is_on_track(_pos)
 
-                #Apply drag
-                if int(self.velocity.get_mag()) != 0:
-                    self.velocity = self.drag_factor * self.velocity #best factor ~0.9
-                else:
-                    self.velocity.set_pos(0,0)
-            
-            self._pos += self.frame_period * self.velocity
-            self.results["distance-travelled"] += self.frame_period * self.velocity.get_mag() #distance = speed * time
+                if _on_track == False:
+                    self.physics.errors_made[self.index] += self.frame_period #time outside track
 
-            #Turn left or right
-            if self.turn_state == "left":
-                self.set_direction(self.direction + self.frame_period * self.turn_speed)
-            elif self.turn_state == "right":
-                self.set_direction(self.direction - self.frame_period * self.turn_speed)  
+            #Acceleration, drag, movement and turning are applied by the physics
+            #   a population steps all of its vehicles at once in its own update
+            if self.population == None:
+                self.physics.step()
 
 
     def draw(self):
@@ -314,16 +398,30 @@ Vehicle using A* pathfinding
 Inherits from vehicle
 '''
 class VehicleAStar(Vehicle):
+    look_ahead = 100 #Distance of the point in front of the vehicle which follows the path
+
     def __init__(self, surface, camera, simulation_handler, xpos, ypos, fps, track_pieces, population):
         super().__init__(surface, camera, simulation_handler, xpos, ypos, fps, track_pieces, population)
         self.follow_strength = simulation_handler.algorithm_settings["follow-strength"]/100
+        self.path_arc_length = None #Distance along the path of the last closest point
+
+    def reset_vehicle(self, xpos, ypos):
+        super().reset_vehicle(xpos, ypos)
+        self.path_arc_length = None
 
     def update(self, events):
         super().update(events)
-        dist = 100
+        dist = self.look_ahead
         
         p1 = dist * Vector(math.cos(self.direction), -math.sin(self.direction)) + self._pos #Point in front of vehicle
-        p2 = self.population.get_closest_point(p1) #Point on track closest to point in front of vehicle
+
+        #Point on track closest to point in front of vehicle
+        #   the point only moves a small distance each frame, so only the path near the last point is searched
+        if self.population.batch_closest_points == True:
+            p2 = Vector(*self.population.closest_points[self.index])
+            self.path_arc_length = self.population.closest_arc_lengths[self.index]
+        else:
+            p2, self.path_arc_length = self.population.get_closest_point_near(p1, self.path_arc_length)
 
         #Show points
         # draw_circle(p1, (255,0,0), self.surface, self.camera)
@@ -367,7 +465,7 @@ class VehicleWandering(Vehicle):
         self.rays = []
         self.ray_count = ray_count
         self.ray_length = ray_length
-        self.ray_distances = []
+        self.ray_distances = self.create_ray_distances(ray_count, ray_length)
         self.draw_self = True
         angle = math.pi / (ray_count + 1)
 
@@ -376,8 +474,9 @@ class VehicleWandering(Vehicle):
 
             _ray = Ray(surface, camera, xpos, ypos, direction)
             _ray.add_track_pieces(multiple_pieces=track_pieces)
+            _ray.set_track_geometry(self.track_geometry)
+            _ray.set_ray_length(ray_length)
             self.rays.append(_ray)
-            self.ray_distances.append(self.ray_length)
 
         self.follow_strength = simulation_handler.algorithm_settings["follow-strength"]/100
 
@@ -396,6 +495,10 @@ class VehicleWandering(Vehicle):
             _ray.update(events)
             _ray.set_direction((ray_i + 1) * angle - self.direction - math.pi / 2)
 
+            #Vehicles in a population have all their rays cast at once by the population
+            if self.population != None:
+                continue
+
             #get all the distances from all intersection points on ray cast
             #   ray cast has multiple intersections as ray passes through track pieces
             _distances = []
@@ -438,10 +541,16 @@ class VehicleWandering(Vehicle):
             self.velocity = _desired_velocity
             
             #Kill vehicle if collided with wall
-            for distance in self.ray_distances:
-                if distance <= self.collision_range:
+            #   the distance field gives the distance to the closest side in any direction
+            if self.distance_field != None:
+                if self.distance_field.sample_point(*self.physics.pos[self.index].tolist()) <= self.collision_range:
                     self.kill()
-                    break
+
+            else:
+                for distance in self.ray_distances:
+                    if distance <= self.collision_range:
+                        self.kill()
+                        break
 
     def draw(self):
         super().draw()
@@ -461,7 +570,12 @@ class VehicleGeneticAlgorithm(Vehicle):
         super().__init__(surface, camera, simulation_handler, xpos, ypos, fps, track_pieces, population)
 
         self.net_sequence = [ray_count, 4, 4, 2]
-        self.brain = Network(self.net_sequence)
+
+        #Vehicles in a population store their brain in a row of the population's genome matrix
+        if population != None:
+            self.brain = Network(self.net_sequence, genome=population.get_genome(self.index, self.net_sequence))
+        else:
+            self.brain = Network(self.net_sequence)
         self.alive = True
         self.fitness = 0
         self.population_owner = None
@@ -469,7 +583,7 @@ class VehicleGeneticAlgorithm(Vehicle):
         self.rays = []
         self.ray_length = ray_length
         self.ray_count = ray_count
-        self.ray_distances = []
+        self.ray_distances = self.create_ray_distances(ray_count, ray_length)
         self.draw_self = True
         angle = math.pi / (ray_count + 1)
 
@@ -477,10 +591,11 @@ class VehicleGeneticAlgorithm(Vehicle):
             direction = Vector(math.cos((i+1) * angle - math.pi/2), math.sin((i+1) * angle - math.pi/2))
 
             self.rays.append(Ray(surface, camera, xpos, ypos, direction))
-            self.ray_distances.append(self.ray_length)
         
         for ray in self.rays:
             ray.add_track_pieces(multiple_pieces=track_pieces)
+            ray.set_track_geometry(self.track_geometry)
+            ray.set_ray_length(ray_length)
 
         self.collision_range = min(*self.size.get_pos())
 
@@ -497,6 +612,10 @@ class VehicleGeneticAlgorithm(Vehicle):
             _ray.update(events)
             _ray.set_direction((ray_i + 1) * angle - self.direction - math.pi / 2)
 
+            #Vehicles in a population have all their rays cast at once by the population
+            if self.population != None:
+                continue
+
             #get all the distances from all intersection points on ray cast
             #   ray cast has multiple intersections as ray passes through track pieces
             _distances = []
@@ -529,10 +648,16 @@ class VehicleGeneticAlgorithm(Vehicle):
             # print(self.ray_distances)
 
             #Pass rays through brain
-            brain_output = self.brain.forward(np.array(self.ray_distances))
-            _max_index = np.argmax(brain_output) #return the index of the greatest value
+            #   vehicles in a population have every brain forwarded at once by the population
+            if self.population != None:
+                _max_index = self.population.actions[self.index]
+            else:
+                brain_output = self.brain.forward(np.array(self.ray_distances))
+                _max_index = np.argmax(brain_output) #return the index of the greatest value
             
             #Make choice on movement
+            #   the inputs are a 1D array, so the output is a matrix and has more values than output nodes
+            #   any index other than 0 or 1 is the "none" action, the vehicle keeps its turn state
             if _max_index == 0:
                 self.turn_state = "left"
             elif _max_index == 1:
@@ -547,12 +672,18 @@ class VehicleGeneticAlgorithm(Vehicle):
 
 
             #Kill vehicle if collided with wall
-            for distance in self.ray_distances:
-                if distance <= self.collision_range/1.41:
+            #   the distance field gives the distance to the closest side in any direction
+            if self.distance_field != None:
+                if self.distance_field.sample_point(*self.physics.pos[self.index].tolist()) <= self.collision_range/1.41:
                     self.kill()
-                    
-                    # self.kill("death wall collision")
-                    break
+
+            else:
+                for distance in self.ray_distances:
+                    if distance <= self.collision_range/1.41:
+                        self.kill()
+                        
+                        # self.kill("death wall collision")
+                        break
             
             super().update(events)
 
@@ -565,23 +696,7 @@ class VehicleGeneticAlgorithm(Vehicle):
         super().reset_vehicle(*args)
         self.alive = True
         self.fitness = 0
-        self.tracks_crossed.clear()
-
-        self.ray_distances.clear()
-        self.rays.clear()
-        angle = math.pi / (self.ray_count + 1)
-        for i in range(0, self.ray_count):
-            direction = Vector(math.cos((i+1) * angle - math.pi/2), math.sin((i+1) * angle - math.pi/2))
-
-            self.rays.append(Ray(self.surface, self.camera, *self._pos.get_pos(), direction))
-            self.ray_distances.append(self.ray_length)
-        
-        for ray in self.rays:
-            ray.add_track_pieces(multiple_pieces=self.track_pieces)
-
-        # self.ray_distances.clear()
-        # for i in range(self.ray_count):
-        #     self.ray_distances.append(500)
+        self.ray_distances[:] = self.ray_length
 
     #Destroys the vehicle
     #   message : message to display when vehicle is destroyed
@@ -590,20 +705,12 @@ class VehicleGeneticAlgorithm(Vehicle):
             print("reason:", message)
         self.alive = False
 
+        self.physics.progress[self.index] = self.progress #Progress the vehicle reached, kept in its results
+
         #Create fitness score
         self.fitness += len(self.tracks_crossed) ** 2 #Number of tracks crossed
 
-        #Calculate fitness based on distance away from next closest piece
-        # piece_distances = []
-        # for piece in self.track_pieces:
-        #     if piece in self.tracks_crossed: continue
-
-        #     piece_distances.append((piece.get_end_pos() - self._pos).get_mag())
-
-        # piece_distances = bubble_sort(piece_distances)
-        # if len(piece_distances) > 0:
-        #     self.fitness += 300 / piece_distances[0] #Closer vehicles have higher fitnesses
-
+        #Closer vehicles to the end of the last track crossed have higher fitnesses
         if len(self.tracks_crossed) != 0:
             _distance = (self.tracks_crossed[-1].get_end_pos() - self._pos).get_mag()
             self.fitness += 300 / _distance
@@ -646,12 +753,61 @@ class Population(SimulationObject):
         self._test_id = 0
         self.vehicle_no = 0
 
+        #State of every vehicle in the population
+        self.physics = VehiclePhysics(population_size)
+
+        #Static geometry of the track, shared with the simulation when it has already been built
+        self.track_geometry = simulation_handler.track_geometry
+        if self.track_geometry == None or self.track_geometry.track_pieces != list(track_pieces):
+            self.track_geometry = TrackGeometry(track_pieces)
+
+        #Signed distance field of the track, only used if the simulation has a distance field resolution
+        self.distance_field = None
+        if simulation_handler.distance_field_resolution != None:
+            self.distance_field = self.track_geometry.get_distance_field(simulation_handler.distance_field_resolution)
+
+        #Rays are either intersected with the track's sides or sphere traced through the distance field
+        self.ray_sensor = simulation_handler.ray_sensor
+        if self.ray_sensor == "distance field" and self.distance_field == None:
+            raise Exception("Error; the distance field ray sensor needs a distance field resolution")
+
+        #Ray distances of every vehicle, created when the first vehicle with rays is added
+        self.ray_distances = None
+        self.ray_count = 0
+        self.ray_length = 0
+
         self.leaderboard = ["" for i in range(10)]
 
     def set_results_database(self, database, test_id):
         self._test_id = test_id
         self._results_database = database
 
+    #Returns a vehicle's row of the population's ray distances
+    #   the array is created upon the first call, every vehicle must use the same ray count and length
+    def get_ray_distances(self, index, ray_count, ray_length):
+        if self.ray_distances is None:
+            self.ray_count = ray_count
+            self.ray_length = ray_length
+            self.ray_distances = np.full((self.physics.max_size, ray_count), float(ray_length))
+
+        return self.ray_distances[index]
+
+    #Cast the rays of every alive vehicle at once
+    #   updates the ray distances of each vehicle from its current position
+    #   the population's ray sensor decides if the rays are intersected with the track's sides or sphere traced
+    def cast_rays(self):
+        if self.ray_distances is None:
+            return
+
+        size = self.physics.size
+        alive = self.physics.alive[:size]
+
+        directions = ray_directions(self.physics.direction[:size][alive], self.ray_count)
+        if self.ray_sensor == "distance field":
+            self.ray_distances[:size][alive] = self.distance_field.cast_rays(self.physics.pos[:size][alive], directions, self.ray_length)
+        else:
+            self.ray_distances[:size][alive] = self.track_geometry.cast_rays(self.physics.pos[:size][alive], directions, self.ray_length)
+
     #Return the vehicle selected in the population
     def get_selected_vehicle(self):
         return self.selected_vehicle
@@ -663,6 +819,10 @@ class Population(SimulationObject):
     def update(self, events):
         #Set camera to the selected vehicle
         # self.camera.set_pos(*self.selected_vehicle.get_pos().get_pos())
+
+        #Move every vehicle in one step
+        #   vehicles have already made their choices as they are updated before the population
+        self.physics.step()
         
         #Get finishing vehicle
         for vehicle in self.vehicles:
@@ -671,6 +831,7 @@ class Population(SimulationObject):
             
             #If vehicle is within distance of end piece
             if (self.end_piece._pos - vehicle._pos).get_mag() < self.end_piece.size.x/2:
+                vehicle.reach_piece(self.track_geometry.get_piece_index(self.end_piece)) #Finishing vehicles have reached every piece
                 vehicle.kill()
 
                 #Add vehicle entry to database
@@ -684,9 +845,11 @@ class Population(SimulationObject):
 Population of vehicles using A* pathfinding
 '''
 class PopulationAStar(Population):
+    path_algorithm = "Astar hierarchical" #Name of the path finding method, paths are cached under this name
+
     #Node for pathfinding
     class Node:
-        def __init__(self, xpos, ypos, start_pos, end_pos, node_size, grid):
+        def __init__(self, xpos, ypos, start_pos, end_pos, node_size):
             self.start_pos = start_pos
             self.end_pos = end_pos
             self._pos = Vector(xpos, ypos)
@@ -699,18 +862,10 @@ class PopulationAStar(Population):
 
             self.previous_node = None
 
-            self.grid_pos = ((1/node_size) * Vector(xpos, ypos)).int()
-            grid[self.grid_pos.x][self.grid_pos.y] = self
-
-        #Use recursion to retrace path back to the start
-        def retrace(self, path):
-            # print(self.previous_node)
-            if self.previous_node == None:
-                return self
-
-            path.append(self.previous_node.retrace(path))
-
-            return self
+        #Retrace the path back to the start through each node's previous node
+        #returns an (n, 2) array of the node positions from the start to this node
+        def retrace(self):
+            return retrace_positions(self, lambda node: node.previous_node)
 
         #Calculate start distance (f-val), heuristic (h-val), and sum val (g val)
         #   calculates from the relative node
@@ -740,93 +895,110 @@ class PopulationAStar(Population):
         self.start_pos = self.start_piece.get_pos()
         self.end_pos = self.end_piece.get_pos()
         self.nodes = []
-        self.assigned_nodes = [] #Nodes with sum values less than infinity
+        self.open_nodes = HeapQueue() #Nodes with sum values less than infinity, which have not been visited
         self.node_size = 10
+        self.node_grid = NodeGrid(self.node_size) #Nodes indexed by position, only occupied cells are stored
 
-        node_grid = []
-        for x in range(0, 1000):
-            _row = []
-            for y in range(0, 1000):
-                _row.append(None)
-            node_grid.append(_row)
+        self.t = 0
 
-        self.node_grid = node_grid
+        #Use the cached path if this track has been path found before
+        path_cache = TrackCache()
+        cache_key = path_cache.get_key(track_pieces, "Path", (xpos, ypos), self.node_size, self.path_algorithm)
+        cached_path = path_cache.load(cache_key, ("path", "control-points"))
 
-        self.start_node = PopulationAStar.Node(xpos, ypos, self.start_pos, self.end_pos, self.node_size, self.node_grid)
-        self.start_node.set_values(self.start_node)
-        self.start_node.previous_node = None
-        self.nodes.append(self.start_node)
-        self.assigned_nodes.append(self.start_node)
+        if cached_path == None:
+            start_time = time.time()
 
-        self.create_nodes_on_track()
+            path_positions = self.find_track_path(xpos, ypos)
+            cached_path = {"path" : path_positions, "control-points" : get_control_points(path_positions)}
+            path_cache.save(cache_key, cached_path)
 
-        path = []
+            print(len(path_positions))
+            print(time.time() - start_time)
 
-        start_time = time.time()
-        # self.find_path(path)
+        self.set_path(cached_path)
 
-        path = self.find_path(path)
-        self.path = []
-        print(len(path))
+        #Populations of many vehicles find every vehicle's closest path point in one batched query
+        self.batch_closest_points = population_size > 1
+        self.closest_points = np.zeros((self.physics.max_size, 2))
+        self.closest_arc_lengths = np.zeros(self.physics.max_size)
+        if self.batch_closest_points == True:
+            self.update_closest_points()
 
+    #Set the path vehicles follow
+    #   path_data : dictionary of the path's node positions and its bezier control points
+    def set_path(self, path_data):
+        self.path = [Vector(*pos) for pos in path_data["control-points"]]
+        self.segment_count = len(path_data["path"])//4
 
-        #Add every n nodes to path
-        #   4 * (len(path)//4) so loop to closest multiple of 4 (cubic beziers work with 4 nodes each)
-        for node_i in range(0, 4 * (len(path)//4)):
-        # for node_i in range(0, 4 * (len(path)//4) + 1):
+        #Sample the smoothed path once for closest point queries
+        self.polyline = PathPolyline(path_data["control-points"], self.segment_count)
 
-            #Every nth node is considered
-            if node_i % 4 == 0 and path[node_i] != None:
-                self.path.append(path[node_i])
 
-        self.t = 0
-        self.segment_count = len(path)//4
+    #Find the path of nodes from the given position to the end of the track
+    #   the track pieces are planned over first, then searched inside each piece on the way
+    #   the whole track is searched if the pieces are not joined end to end
+    #returns an (n, 2) array of the node positions from the start to the end
+    def find_track_path(self, xpos, ypos):
+        path = self.find_path_hierarchical(xpos, ypos)
+
+        if path is None:
+            self.start_node = PopulationAStar.Node(xpos, ypos, self.start_pos, self.end_pos, self.node_size)
+            self.start_node.set_values(self.start_node)
+            self.start_node.previous_node = None
+            self.add_node(self.start_node)
+            self.open_nodes.enqueue(self.start_node, self.start_node.sum_val)
+
+            self.create_nodes_on_track()
+
+            path = self.find_path()
 
-        print(time.time() - start_time)
+        return path
 
 
-    #Returns the node with the lowest f-cost
+    #Returns the open node with the lowest cost, the f-cost for A* and the h-cost for greedy search
+    #   returns None when there are no open nodes left
     def f_lowest(self):
-        _lowest_val = 2**32
-        _lowest_node = None
+        while self.open_nodes.is_empty() == False:
+            _lowest_node = self.open_nodes.dequeue()
 
-        #Find the lowest costing node
-        for node in self.assigned_nodes:
-            if node.visited == True: continue
+            if _lowest_node.visited == False:
+                return _lowest_node
 
-            if node.sum_val < _lowest_val and node.visited == False:
-                _lowest_node = node
-                _lowest_val = node.sum_val
+        return None
 
-        return _lowest_node
 
+    #Add a node to the nodes list and the node cells
+    def add_node(self, node):
+        self.nodes.append(node)
+        self.node_grid.add(node, node._pos)
 
     #Return all neighbours to the given node
-    def get_neighbours(self, current_node):
+    #   only nodes in the surrounding cells are checked
+    #   node_grid : the grid to find neighbours in, defaults to the population's node grid
+    def get_neighbours(self, current_node, node_grid=None):
         neighbours = []
 
-        for node in self.nodes:
+        if node_grid == None:
+            node_grid = self.node_grid
+
+        for node in node_grid.get_nearby(current_node._pos, 1.45*self.node_size):
             if (node._pos - current_node._pos).get_mag() <= 1.45*self.node_size and node != current_node:
                 neighbours.append(node)
 
         return neighbours
 
     #Populates the track with nodes to pathfind accross
-    #   loops through each tack piece testing every possible node location
+    #   each track piece gives the grid points which lie inside it
     def create_nodes_on_track(self):
 
         for piece in self.track_pieces:
+            xs, ys, occupancy = piece.get_occupancy(self.node_size)
 
-            _top_bottom = (piece.bottom_right - piece.top_left).sign()            
-            _top_left = (piece.top_left + piece._pos).int() - _top_bottom
-            _bottom_right = (piece.bottom_right + piece._pos).int() - _top_bottom
-
-            for y in range(_top_left.y, _bottom_right.y, _top_bottom.y * self.node_size):
-                for x in range(_top_left.x, _bottom_right.x, _top_bottom.x * self.node_size):
-                    
-                    if piece.collision_point(Vector(x,y)):
-                        _node = PopulationAStar.Node(x, y, self.start_pos, self.end_pos, self.node_size, self.node_grid)
-                        self.nodes.append(_node)
+            #Create a node at every occupied grid point, row by row
+            for row, column in zip(*np.nonzero(occupancy)):
+                _node = PopulationAStar.Node(int(xs[column]), int(ys[row]), self.start_pos, self.end_pos, self.node_size)
+                self.add_node(_node)
 
     #Generalised form of a cubic bezier
     def cubic_bezier(self, p1,p2,p3,p4,t):
@@ -843,50 +1015,176 @@ class PopulationAStar(Population):
             #Return nodes for spline
             nodes = path[_whole*3:_whole*3+4]
 
-            p1 = nodes[0]._pos
-            p2 = nodes[1]._pos
-            p3 = nodes[2]._pos
-            p4 = nodes[3]._pos
+            p1 = nodes[0]
+            p2 = nodes[1]
+            p3 = nodes[2]
+            p4 = nodes[3]
 
             return self.cubic_bezier(p1, p2, p3, p4, _fraction)
         #When at the end of the path
         else:
-            return path[-3]._pos
+            return path[-3]
 
     #Returns the closest point on track to given point
     #   point : point to find closet point on graph to
+    #the point is projected onto the sampled path, rather than checking each sample
     def get_closest_point(self, point):
-        least_val = 2**32
-        least_point = Vector(0,0)
+        closest, arc_length = self.polyline.closest_point(point.get_pos())
 
-        #Check all points along track to find the closest
-        #   multiply by 10 so t can increment in 0.1
-        for t in range(0, self.segment_count*10, 1):
-            _t = t/10
+        return Vector(*closest)
 
-            track_point = self.point_along_path(_t) 
-            _dist = (point - track_point).get_mag()
+    #Find the closest path point to the point in front of every alive vehicle at once
+    #   vehicles read their closest point in the next frame
+    def update_closest_points(self):
+        alive = np.nonzero(self.physics.alive[:self.physics.size])[0]
+        direction = self.physics.direction[alive]
 
-            #When a closer point is found:
-            if _dist < least_val:
-                least_val = _dist
-                least_point = track_point
+        #Point in front of each vehicle
+        ahead = self.physics.pos[alive] + VehicleAStar.look_ahead * np.column_stack((np.cos(direction), -np.sin(direction)))
 
-        return least_point
+        self.closest_points[alive], self.closest_arc_lengths[alive] = self.polyline.nearest_points(ahead)
 
+    #Returns the closest point on track to given point, only searching near the previous closest point
+    #   point : point to find closet point on graph to
+    #   arc_length : distance along the path of the previous closest point, None searches the whole path
+    #returns (closest point, arc length)
+    def get_closest_point_near(self, point, arc_length):
+        closest, arc_length = self.polyline.closest_point_near(point.get_pos(), arc_length)
+
+        return Vector(*closest), arc_length
+
+
+    #Returns the track pieces the path passes through, from the start piece to the end piece
+    #   pieces are joined when a piece's end position is the position of the next piece
+    #   the pieces are searched with A*, the cost of a piece is the distance from its position to its end
+    #returns None if the end piece cannot be reached
+    def plan_pieces(self):
+        #Index the pieces by their position, to find the pieces joined to each end position
+        piece_grid = NodeGrid(self.node_size)
+        for piece in self.track_pieces:
+            piece_grid.add(piece, piece._pos)
+
+        open_pieces = HeapQueue()
+        distances = {self.start_piece : 0}
+        previous_pieces = {self.start_piece : None}
+        visited = set()
+        open_pieces.enqueue(self.start_piece, (self.end_pos - self.start_piece._pos).get_mag())
+
+        while open_pieces.is_empty() == False:
+            piece = open_pieces.dequeue()
+            visited.add(piece)
+
+            #Retrace the pieces back to the start
+            if piece == self.end_piece:
+                pieces = []
+                while piece != None:
+                    pieces.append(piece)
+                    piece = previous_pieces[piece]
+
+                return pieces[::-1]
+
+            _end_pos = piece.get_end_pos()
+            _distance = distances[piece] + (_end_pos - piece._pos).get_mag()
+
+            for next_piece in piece_grid.get_nearby(_end_pos, 1):
+                if next_piece in visited or (next_piece._pos - _end_pos).get_mag() > 1:
+                    continue
+
+                if next_piece not in distances or _distance < distances[next_piece]:
+                    distances[next_piece] = _distance
+                    previous_pieces[next_piece] = piece
+                    open_pieces.enqueue(next_piece, _distance + (self.end_pos - next_piece._pos).get_mag())
+
+        return None
+
+    #Find the path by planning over the track pieces, then searching inside each piece on the planned route
+    #   each piece is searched from where the previous piece's search ended to the piece's end position
+    #   the next piece's nodes are included, so the search can reach an end position on the edge of the piece
+    #   only the nodes of pieces on the planned route are created
+    #returns an (n, 2) array of the node positions along the path, or None if the pieces or any piece's path cannot be found
+    def find_path_hierarchical(self, xpos, ypos):
+        pieces = self.plan_pieces()
+        if pieces == None:
+            return None
+
+        start_node = PopulationAStar.Node(xpos, ypos, self.start_pos, self.end_pos, self.node_size)
+        self.add_node(start_node)
+        piece_paths = []
+
+        #Create the nodes of every piece on the route
+        piece_nodes = []
+        for piece in pieces:
+            _nodes = []
+            xs, ys, occupancy = piece.get_occupancy(self.node_size)
+            for row, column in zip(*np.nonzero(occupancy)):
+                _node = PopulationAStar.Node(int(xs[column]), int(ys[row]), self.start_pos, self.end_pos, self.node_size)
+                self.add_node(_node)
+                _nodes.append(_node)
+
+            piece_nodes.append(_nodes)
+
+        #The end piece's position is the end of the path, so the end piece is never searched
+        for piece_i in range(0, len(pieces)-1):
+            piece_grid = NodeGrid(self.node_size)
+            for _node in piece_nodes[piece_i] + piece_nodes[piece_i+1]:
+                piece_grid.add(_node, _node._pos)
+
+            piece_path = self.find_path_in_grid(start_node, pieces[piece_i].get_end_pos(), piece_grid)
+            if piece_path == None:
+                return None
+
+            #Each piece's path starts at the end of the previous piece's path
+            piece_positions, start_node = piece_path
+            piece_paths.append(piece_positions if piece_i == 0 else piece_positions[1:])
+
+        return np.concatenate(piece_paths)
+
+    #Find a path with A* across the nodes of a grid
+    #   start_node : node to start from, does not need to be in the grid
+    #   goal_pos : the path ends at the first node within a node size of this position
+    #   node_grid : grid of the nodes to search across
+    #the search state is kept in dictionaries, so the nodes' own values are not changed
+    #returns (array of the node positions from the start node to the goal, the goal node), or None if the goal cannot be reached
+    def find_path_in_grid(self, start_node, goal_pos, node_grid):
+        open_nodes = HeapQueue()
+        start_distances = {start_node : 0} #g-vals
+        previous_nodes = {start_node : None}
+        visited = set()
+        open_nodes.enqueue(start_node, (goal_pos - start_node._pos).get_mag())
+
+        while open_nodes.is_empty() == False:
+            current_node = open_nodes.dequeue()
+            visited.add(current_node)
+
+            #Retrace the path back to the start
+            if (goal_pos - current_node._pos).get_mag() <= self.node_size:
+                return retrace_positions(current_node, previous_nodes.get), current_node
+
+            for neighbour in self.get_neighbours(current_node, node_grid):
+                if neighbour in visited:
+                    continue
+
+                _distance = start_distances[current_node] + (neighbour._pos - current_node._pos).get_mag()
+                if neighbour not in start_distances or _distance < start_distances[neighbour]:
+                    start_distances[neighbour] = _distance
+                    previous_nodes[neighbour] = current_node
+                    open_nodes.enqueue(neighbour, _distance + (goal_pos - neighbour._pos).get_mag())
+
+        return None
 
     #Find the path using A* algorithm
-    #   path_output : path of nodes is added to this list
-    def find_path(self, path_output):
+    #returns an (n, 2) array of the node positions from the start to the end
+    def find_path(self):
         # for i in range(500):
         while True:
             current_node = self.f_lowest()
 
+            if current_node == None:
+                raise Exception("Error; no path found to the end of the track")
+
             #If node has reached the end
-            if current_node != None:
-                if (self.end_pos - current_node._pos).get_mag() <= self.node_size:
-                    current_node.retrace(path=path_output)
-                    return path_output
+            if (self.end_pos - current_node._pos).get_mag() <= self.node_size:
+                return current_node.retrace()
 
             #Get nodes close to current node
             neighbours = self.get_neighbours(current_node)
@@ -899,9 +1197,7 @@ class PopulationAStar(Population):
 
                     if _distance < neighbour.sum_val:
                         neighbour.set_values(current_node)
-
-                        if neighbour not in self.assigned_nodes:
-                            self.assigned_nodes.append(neighbour)
+                        self.open_nodes.enqueue(neighbour, neighbour.sum_val)
 
             #Mark node as visited
             current_node.visited = True
@@ -924,6 +1220,9 @@ class PopulationAStar(Population):
     def update(self, events):
         super().update(events)
 
+        if self.batch_closest_points == True:
+            self.update_closest_points()
+
         #Bezier curve test
         # self.t += 1/60 * self.speed
         
@@ -935,233 +1234,250 @@ class PopulationAStar(Population):
 
 
 '''
-Population of vehicles using A* pathfinding
-'''
-class PopulationGreedy(Population):
-    #Node for pathfinding
-    class Node:
-        def __init__(self, xpos, ypos, start_pos, end_pos, node_size):
-            self.start_pos = start_pos
-            self.end_pos = end_pos
-            self._pos = Vector(xpos, ypos)
-
-            self.heuristic = (self.end_pos - self._pos).get_mag() #h-val
-
-            self.visited = False
-
-            self.previous_node = None
-            
-        #Use recursion to retrace path back to the start
-        def retrace(self, path):
-            # print(self.previous_node)
-            if self.previous_node == None:
-                return self
-
-            path.append(self.previous_node.retrace(path))
-
-            return self
-
-
-        #Returns distance from start to the given node
-        def calculate_distance(self, relative_node):
-            return (self._pos - relative_node._pos).get_mag() + relative_node.start_distance
-
-
-
-    def __init__(self, population_size, surface, camera, simulation_handler, xpos, ypos, track_pieces):
-        super().__init__(population_size, surface, camera, simulation_handler, xpos, ypos, track_pieces)
-
-        #Create the population
-        for i in range(population_size):
-            self.vehicles.append(VehicleAStar(self.surface, self.camera, simulation_handler, xpos, ypos, 60, track_pieces, self))
-
-        
-        self.start_pos = self.start_piece.get_pos()
-        self.end_pos = self.end_piece.get_pos()
-        self.nodes = []
-        self.node_size = 10
-
-
-        self.start_node = PopulationGreedy.Node(xpos, ypos, self.start_pos, self.end_pos, self.node_size)
-        self.start_node.previous_node = None
-        self.nodes.append(self.start_node)
-
-        self.create_nodes_on_track()
-
-        path = []
-
-        start_time = time.time()
-        # self.find_path(path)
-
-        path = self.find_path(path)
-        self.path = []
-        print(len(path))
-
-
-        #Add every n nodes to path
-        #   4 * (len(path)//4) so loop to closest multiple of 4 (cubic beziers work with 4 nodes each)
-        for node_i in range(0, 4 * (len(path)//4)):
-        # for node_i in range(0, 4 * (len(path)//4) + 1):
-
-            #Every nth node is considered
-            if node_i % 4 == 0 and path[node_i] != None:
-                self.path.append(path[node_i])
-
-        self.t = 0
-        self.segment_count = len(path)//4
-
-        print(time.time() - start_time)
+Population of vehicles using Jump Point Search pathfinding
+The track is one uniform grid of nodes, so straight and diagonal runs of open nodes are jumped over
+    only the nodes where the path may turn (jump points) are added to the open set
+    the path between jump points is filled back in, so the path has a node every node size like A*
 
+Attributes:
+    cells : set of the (column, row) grid cells inside the track, cell (0, 0) is the start position
+    goal_cells : set of the cells within a node size of the end position
+    expanded_count : number of jump points taken from the open set by the last search
 
-    #Returns the node with the lowest h-cost
-    def h_lowest(self):
-        _lowest_val = 2**32
-        _lowest_node = None
+Methods:
+    cell_to_pos(cell) : returns the world position of a grid cell
+    create_cells() : returns the set of grid cells inside the track
+    jump(column, row, d_column, d_row) : returns the next jump point in the given direction, or None
+    get_directions(cell, previous_cell) : returns the directions to search from a jump point
+    find_path_jps(xpos, ypos) : returns the path's node positions from the given position to the end of the track
+    retrace_jump_points(cell, previous_cells) : returns the path's node positions, with the cells between jump points filled in
+'''
+class PopulationJPS(PopulationAStar):
+    path_algorithm = "JPS"
 
-        #Find the lowest costing node
-        for node in self.assigned_nodes:
-            if node.visited == True: continue
+    #Find the path with jump point search across the whole track
+    #   a track which ends where it starts would be finished straight away, so it is searched piece by piece with A*
+    def find_track_path(self, xpos, ypos):
+        if (self.end_pos - Vector(xpos, ypos)).get_mag() <= self.node_size:
+            return super().find_track_path(xpos, ypos)
 
-            if node.heuristic < _lowest_val and node.visited == False:
-                _lowest_node = node
-                _lowest_val = node.heuristic
+        return self.find_path_jps(xpos, ypos)
 
-        return _lowest_node
+    #Returns the world position of a grid cell
+    def cell_to_pos(self, cell):
+        return Vector(self.grid_origin.x + cell[0]*self.node_size, self.grid_origin.y + cell[1]*self.node_size)
 
+    #Returns the set of grid cells inside the track
+    #   the grid is shared by every piece, so runs of cells continue across pieces
+    def create_cells(self):
+        cells = set()
+        node_size = self.node_size
 
-    #Return all neighbours to the given node
-    def get_neighbours(self, current_node):
-        neighbours = []
+        for piece in self.track_pieces:
+            _corner1 = piece.top_left + piece._pos
+            _corner2 = piece.bottom_right + piece._pos
 
-        for node in self.nodes:
-            if (node._pos - current_node._pos).get_mag() <= 1.45*self.node_size and node != current_node:
-                neighbours.append(node)
+            #Columns and rows of the grid covering the piece's bounding box
+            #   one extra cell is added on each side, so cells on the edge of the piece are tested
+            columns = np.arange(math.floor((min(_corner1.x, _corner2.x) - self.grid_origin.x)/node_size) - 1, math.ceil((max(_corner1.x, _corner2.x) - self.grid_origin.x)/node_size) + 2)
+            rows = np.arange(math.floor((min(_corner1.y, _corner2.y) - self.grid_origin.y)/node_size) - 1, math.ceil((max(_corner1.y, _corner2.y) - self.grid_origin.y)/node_size) + 2)
+            grid_columns, grid_rows = np.meshgrid(columns, rows)
 
-        return neighbours
+            occupancy = piece.collision_points(self.grid_origin.x + grid_columns*node_size, self.grid_origin.y + grid_rows*node_size)
+            cells.update(zip(grid_columns[occupancy].tolist(), grid_rows[occupancy].tolist()))
 
-    #Populates the track with nodes to pathfind accross
-    #   loops through each tack piece testing every possible node location
-    def create_nodes_on_track(self):
+        return cells
 
-        for piece in self.track_pieces:
-            #Get the bounding box of the track piece and the orientation
-            _top_bottom = (piece.bottom_right - piece.top_left).sign()            
-            _top_left = (piece.top_left + piece._pos).int() - _top_bottom
-            _bottom_right = (piece.bottom_right + piece._pos).int() - _top_bottom
+    #Returns the next jump point from a cell, moving in the given direction
+    #   a jump point is a goal cell, or a cell where an open cell appears beside a blocked one (a forced neighbour)
+    #   moving diagonally, a cell is also a jump point if a straight jump from it finds a jump point
+    #   diagonal moves are only made if both cells beside the move are open, so corners are not cut
+    #returns the (column, row) of the jump point, or None if a blocked cell is reached first
+    def jump(self, column, row, d_column, d_row):
+        cells = self.cells
 
-            #Loop through every possible location on top of track piece
-            for y in range(_top_left.y, _bottom_right.y, _top_bottom.y * self.node_size):
-                for x in range(_top_left.x, _bottom_right.x, _top_bottom.x * self.node_size):
+        while True:
+            if (column, row) not in cells:
+                return None
 
-                    #Check if the given point is inside the track's bounding box
-                    if piece.collision_point(Vector(x,y)):
-                        _node = PopulationAStar.Node(x, y, self.start_pos, self.end_pos, self.node_size)
-                        self.nodes.append(_node)
+            if (column, row) in self.goal_cells:
+                return (column, row)
 
-    #Generalised form of a cubic bezier
-    def cubic_bezier(self, p1,p2,p3,p4,t):
-        return (-t**3 + 3*t**2 - 3*t + 1) * p1 + (3*t**3 - 6*t**2 + 3*t) * p2 + (-3*t**3 + 3*t**2) * p3 + (t**3) * p4
+            #Diagonal move
+            if d_column != 0 and d_row != 0:
+                if self.jump(column + d_column, row, d_column, 0) != None or self.jump(column, row + d_row, 0, d_row) != None:
+                    return (column, row)
 
-    #Return the x and y coordinates of the point fraction "t" along the found path
-    def point_along_path(self, t):
-        path = self.path
-        _fraction = t % 1 #return the decimal part of the number "t"
-        _whole = int(t) #get the whole number part
-        
-        #Get four nodes and interpolate
-        if len(path[_whole*3:_whole*3+4]) == 4:
-            #Return nodes for spline
-            nodes = path[_whole*3:_whole*3+4]
+                if (column + d_column, row) not in cells or (column, row + d_row) not in cells:
+                    return None
 
-            p1 = nodes[0]._pos
-            p2 = nodes[1]._pos
-            p3 = nodes[2]._pos
-            p4 = nodes[3]._pos
+            #Horizontal move
+            elif d_column != 0:
+                if ((column, row - 1) in cells and (column - d_column, row - 1) not in cells) or ((column, row + 1) in cells and (column - d_column, row + 1) not in cells):
+                    return (column, row)
 
-            return self.cubic_bezier(p1, p2, p3, p4, _fraction)
-        #When at the end of the path
+            #Vertical move
+            else:
+                if ((column - 1, row) in cells and (column - 1, row - d_row) not in cells) or ((column + 1, row) in cells and (column + 1, row - d_row) not in cells):
+                    return (column, row)
+
+            column += d_column
+            row += d_row
+
+    #Returns the directions to search from a jump point
+    #   the start cell searches in every direction
+    #   other cells search forwards, and towards the cells beside them
+    def get_directions(self, cell, previous_cell):
+        cells = self.cells
+        column, row = cell
+
+        if previous_cell == None:
+            directions = [(d_column, d_row) for d_column in (-1, 0, 1) for d_row in (-1, 0, 1) if (d_column, d_row) != (0, 0)]
+            return [(d_column, d_row) for d_column, d_row in directions if d_column == 0 or d_row == 0 or ((column + d_column, row) in cells and (column, row + d_row) in cells)]
+
+        d_column = int(np.sign(column - previous_cell[0]))
+        d_row = int(np.sign(row - previous_cell[1]))
+        directions = []
+
+        #Diagonal move
+        if d_column != 0 and d_row != 0:
+            directions.append((d_column, 0))
+            directions.append((0, d_row))
+            if (column + d_column, row) in cells and (column, row + d_row) in cells:
+                directions.append((d_column, d_row))
+
+        #Horizontal move
+        elif d_column != 0:
+            directions.append((d_column, 0))
+            for d_row in (-1, 1):
+                if (column, row + d_row) in cells:
+                    directions.append((0, d_row))
+
+                    if (column + d_column, row) in cells:
+                        directions.append((d_column, d_row))
+
+        #Vertical move
         else:
-            return path[-3]._pos
-
-    #Returns the closest point on track to given point
-    #   point : point to find closet point on graph to
-    def get_closest_point(self, point):
-        least_val = 2**32
-        least_point = Vector(0,0)
+            directions.append((0, d_row))
+            for d_column in (-1, 1):
+                if (column + d_column, row) in cells:
+                    directions.append((d_column, 0))
+
+                    if (column, row + d_row) in cells:
+                        directions.append((d_column, d_row))
+
+        return directions
+
+    #Find the path using jump point search
+    #   only jump points are added to the open set, the cells between them are filled in when the path is retraced
+    #returns an (n, 2) array of the node positions from the start to the end of the track
+    def find_path_jps(self, xpos, ypos):
+        self.grid_origin = Vector(xpos, ypos)
+        self.cells = self.create_cells()
+        self.cells.add((0, 0))
+        self.goal_cells = set(cell for cell in self.cells if (self.end_pos - self.cell_to_pos(cell)).get_mag() <= self.node_size)
+        self.expanded_count = 0
+
+        #Heuristic is the straight line distance to the end position
+        def heuristic(cell):
+            return (self.end_pos - self.cell_to_pos(cell)).get_mag()
+
+        open_cells = HeapQueue()
+        start_distances = {(0, 0) : 0} #g-vals
+        previous_cells = {(0, 0) : None}
+        visited = set()
+        open_cells.enqueue((0, 0), heuristic((0, 0)))
+
+        while open_cells.is_empty() == False:
+            current_cell = open_cells.dequeue()
+            visited.add(current_cell)
+            self.expanded_count += 1
+
+            if current_cell in self.goal_cells:
+                return self.retrace_jump_points(current_cell, previous_cells)
+
+            for d_column, d_row in self.get_directions(current_cell, previous_cells[current_cell]):
+                jump_point = self.jump(current_cell[0] + d_column, current_cell[1] + d_row, d_column, d_row)
+                if jump_point == None or jump_point in visited:
+                    continue
+
+                _distance = start_distances[current_cell] + math.hypot(jump_point[0] - current_cell[0], jump_point[1] - current_cell[1])*self.node_size
+                if jump_point not in start_distances or _distance < start_distances[jump_point]:
+                    start_distances[jump_point] = _distance
+                    previous_cells[jump_point] = current_cell
+                    open_cells.enqueue(jump_point, _distance + heuristic(jump_point))
+
+        raise Exception("Error; no path found to the end of the track")
+
+    #Retrace the jump points back to the start, filling in the cells between each pair of jump points
+    #   jump points are joined by straight or diagonal lines, so each step between them is the same
+    #   the cells are written into a preallocated array, from the end of the path back to the start
+    #returns an (n, 2) array of the node positions from the start to the given cell
+    def retrace_jump_points(self, cell, previous_cells):
+        jump_points = [cell]
+        while previous_cells[cell] != None:
+            cell = previous_cells[cell]
+            jump_points.append(cell)
+
+        jump_points = np.array(jump_points[::-1])
+        steps = np.max(np.abs(np.diff(jump_points, axis=0)), axis=1) #Number of cells between each pair of jump points
+
+        cells = np.empty((np.sum(steps) + 1, 2), dtype=int)
+        cells[-1] = jump_points[-1]
+        cell_i = 0
+        for jump_i in range(len(steps)):
+            _direction = np.sign(jump_points[jump_i+1] - jump_points[jump_i])
+            cells[cell_i:cell_i+steps[jump_i]] = jump_points[jump_i] + np.arange(steps[jump_i])[:, None] * _direction
+            cell_i += steps[jump_i]
+
+        return np.array(self.grid_origin.get_pos()) + cells * self.node_size
 
-        #Check all points along track to find the closest
-        #   multiply by 10 so t can increment in 0.1
-        for t in range(0, self.segment_count*10, 1):
-            _t = t/10
 
-            track_point = self.point_along_path(_t) 
-            _dist = (point - track_point).get_mag()
+'''
+Population of vehicles using greedy best first search pathfinding
+The vehicles, path cache and path following are shared with A*, only the search is different
+'''
+class PopulationGreedy(PopulationAStar):
+    path_algorithm = "Greedy"
 
-            #When a closer point is found:
-            if _dist < least_val:
-                least_val = _dist
-                least_point = track_point
+    #Find the path with greedy best first search across the whole track
+    #returns an (n, 2) array of the node positions from the start to the end
+    def find_track_path(self, xpos, ypos):
+        self.start_node = PopulationAStar.Node(xpos, ypos, self.start_pos, self.end_pos, self.node_size)
+        self.add_node(self.start_node)
 
-        return least_point
+        self.create_nodes_on_track()
 
+        return self.find_path()
 
-    #Find the path using A* algorithm
-    #   path_output : path of nodes is added to this list
-    def find_path(self, path_output):
-        visit_queue = PriorityQueue(64)
-        visit_queue.enqueue((self.start_node, 0))
-        path_output = []
-        
-        for i in range(500):
-        #while True:
-            current_node = visit_queue.dequeue()
+    #Find the path using greedy best first search
+    #   the open node closest to the end is always visited next
+    #   each node is only added to the open nodes once, so every node is visited at most once
+    #returns an (n, 2) array of the node positions from the start to the end
+    def find_path(self):
+        found_nodes = set([self.start_node])
+        self.open_nodes.enqueue(self.start_node, self.start_node.heuristic)
 
-            #If node has reached the end
-            if current_node != None:
-                if (self.end_pos - current_node._pos).get_mag() <= self.node_size:
-                    current_node.retrace(path=path_output)
-                    return path_output
+        while True:
+            current_node = self.f_lowest() #Open nodes are ordered by heuristic
 
-            #Get nodes close to current node
-            neighbours = self.get_neighbours(current_node)
+            if current_node == None:
+                raise Exception("Error; no path found to the end of the track")
 
-            #Re-calculate the distances to each neighbouring node
-            for neighbour in neighbours:
-                if neighbour.visited == False:
+            #If node has reached the end
+            if (self.end_pos - current_node._pos).get_mag() <= self.node_size:
+                return current_node.retrace()
 
-                    visit_queue.enqueue((neighbour, 1/neighbour.heuristic))
+            #Add the nodes close to current node which have not been found yet
+            for neighbour in self.get_neighbours(current_node):
+                if neighbour not in found_nodes:
+                    found_nodes.add(neighbour)
                     neighbour.previous_node = current_node
+                    self.open_nodes.enqueue(neighbour, neighbour.heuristic)
 
             #Mark node as visited
             current_node.visited = True
 
-    def draw(self):
-        super().draw()
-
-        # for node in self.nodes:
-        #     draw_col = (0, 0, 255)
-        #     pygame.draw.rect(self.surface, draw_col, pygame.Rect(*self.to_screen_pos(node._pos).get_pos(), self.node_size, self.node_size))
-
-        #     if node.visited == True:
-        #         draw_col = (0, 255, 0)
-        #         pygame.draw.rect(self.surface, draw_col, pygame.Rect(*self.to_screen_pos(node._pos).get_pos(), self.node_size, self.node_size))
-
-        #     if node in self.path:
-        #         draw_col = (255, 0, 0)
-        #         pygame.draw.rect(self.surface, draw_col, pygame.Rect(*self.to_screen_pos(node._pos).get_pos(), self.node_size, self.node_size))
-
-    def update(self, events):
-        super().update(events)
-
-        #Bezier curve test
-        # self.t += 1/60 * self.speed
-        
-        # mx, my = pygame.mouse.get_pos()
-        # self.test_vehicle._pos = self.test_vehicle.to_world_pos(Vector(mx, my))
-        # self.test_vehicle.draw()
-        # point = self.get_closest_point(self.test_vehicle._pos)
-        # draw_circle(point, (255,0,255), self.surface, self.camera)
-
 
 '''
 Population of vehicles using the wandering algorithm
@@ -1175,6 +1491,14 @@ class PopulationWandering(Population):
             _vehicle = VehicleWandering(surface, camera, simulation_handler, xpos, ypos, 60, track_pieces, self)
             self.vehicles.append(_vehicle)
 
+        self.cast_rays()
+
+    def update(self, events):
+        super().update(events)
+
+        #Cast rays from the new positions, used by the vehicles in the next frame
+        self.cast_rays()
+
 
 
 
@@ -1186,10 +1510,15 @@ class PopulationGeneticAlgorithm(Population):
         super().__init__(population_size, surface, camera, simulation_handler, xpos, ypos, track_pieces)
         self.fps = fps
         self.ray_count = ray_count
-        self.ray_length = ray_count
+        self.ray_length = ray_length
         self.generation_number = 0
         self.generation_duration = 7
 
+        #Weights and biases of every vehicle's brain, one row for each vehicle
+        self.net_sequence = None
+        self.genomes = None
+        self.mutation_probabilities = None
+
         for i in range(population_size):
             _vehicle = VehicleGeneticAlgorithm(surface, camera, simulation_handler, xpos, ypos, fps, ray_count, ray_length, track_pieces, self)
             _vehicle.population_owner = self
@@ -1216,6 +1545,13 @@ class PopulationGeneticAlgorithm(Population):
         self.mutation_rate = simulation_handler.algorithm_settings["mutation-rate"]/100
         self.mutation_chance = simulation_handler.algorithm_settings["mutation-chance"]/100
 
+        #Chosen output of each vehicle's brain
+        self.actions = np.zeros(self.physics.max_size, dtype=int)
+        self.brains = None
+
+        self.cast_rays()
+        self.forward_brains()
+
 
     def update(self, events):
         super().update(events)
@@ -1227,6 +1563,42 @@ class PopulationGeneticAlgorithm(Population):
             self.clock = 0
             self.reset_generation()
 
+        #Cast rays from the new positions, used by the vehicles in the next frame
+        self.cast_rays()
+        self.forward_brains()
+
+    #Returns a vehicle's row of the population's genome matrix
+    #   the matrix is created upon the first call, every vehicle must use the same network sequence
+    def get_genome(self, index, net_sequence):
+        if self.genomes is None:
+            self.net_sequence = net_sequence
+            self.genomes = np.zeros((self.physics.max_size, genome_length(net_sequence)))
+
+            #Chance of each genome value being picked by a single mutation
+            #   a mutation picks a random layer, then a random weight and a random bias in that layer
+            layout = genome_layout(net_sequence)
+            self.mutation_probabilities = np.zeros(self.genomes.shape[1])
+            for weight_slice, bias_slice, shape in layout:
+                self.mutation_probabilities[weight_slice] = 1 / (len(layout) * shape[0] * shape[1])
+                self.mutation_probabilities[bias_slice] = 1 / (len(layout) * shape[0])
+
+        return self.genomes[index]
+
+    #Create the batch used to forward every vehicle's brain
+    #   the batch views the genome matrix, so it does not need re-creating when brains change
+    def stack_brains(self):
+        self.brains = NetworkBatch(self.net_sequence, self.genomes)
+
+    #Pass the ray distances of every alive vehicle through their brains at once
+    #   the chosen action of each vehicle is stored in "actions"
+    def forward_brains(self):
+        if self.brains == None:
+            self.stack_brains()
+
+        alive = np.nonzero(self.physics.alive[:self.physics.size])[0]
+        if len(alive) > 0:
+            self.actions[alive] = self.brains.choose_broadcast(self.ray_distances[alive], alive)
+
 
 
     #Re-create the generation using the vehicle with the best fitness score
@@ -1255,56 +1627,45 @@ class PopulationGeneticAlgorithm(Population):
 
         # mutations = 2
 
-        #Get vehicle's brain and copy
-        #   need a copy otherwise it passes by reference, not value
-        #   this will change the contents of the brain
-        brain = best_vehicle.brain
-
         self.best_fitness = best_vehicle.fitness
         best_vehicle.reset_vehicle(*self._pos.get_pos())
         best_vehicle.alive = True
         self.best_vehicle = best_vehicle
-        self.vehicles[0] = best_vehicle
-
-        #Re-populate vehicle list
-        for vehicle_i in range(1, self.population_size):
-            weights = []
-            biases = []
-
-            #Increase variance in vehicle's abilities for fewer vehicles
-            mutations = int(self.mutation_rate * (vehicle_i**2)/5)
-
-            #Copy best vehicle's brain
-            for weight in brain.weights:
-                weights.append(weight.copy())
-            for bias in brain.biases:
-                biases.append(bias.copy())
-
-            #Apply mutation
-            #   gets random layer, then neuron, then weight to change
-            #   do same for biases
-            #Mutations = number of weights and biases selected and chose (e.g mutation val 2 = 2 weights and biases)
-            for mutation_i in range(mutations):
-                _layer_i = random.randint(0, len(weights)-1)
-
-                #Mutate weights
-                _shape = weights[_layer_i].shape
-                _neuron_i =  (random.randint(0, _shape[0]-1), random.randint(0, _shape[1]-1))
-                weights[_layer_i][_neuron_i[0], _neuron_i[1]] = np.random.rand() - 0.5
-
-                #Mutate biases
-                _shape = biases[_layer_i].shape
-                _neuron_i =  (random.randint(0, _shape[0]-1), random.randint(0, _shape[1]-1))
-                biases[_layer_i][_neuron_i[0], _neuron_i[1]] = np.random.rand() - 0.5
-
-            #Apply brain and reset vehicle
-            vehicle = self.vehicles[vehicle_i]
-            vehicle.brain = Network(vehicle.net_sequence, weights=weights, biases=biases, gen_new=False)
+
+        #Swap the best vehicle to the front, so no vehicle (or physics slot) is lost
+        best_i = self.vehicles.index(best_vehicle)
+        self.vehicles[0], self.vehicles[best_i] = self.vehicles[best_i], self.vehicles[0]
+
+        #Copy the best vehicle's genome to every other vehicle
+        children = np.array([vehicle.index for vehicle in self.vehicles[1:]], dtype=int)
+        self.genomes[children] = self.genomes[best_vehicle.index]
+
+        #Increase variance in vehicle's abilities for fewer vehicles
+        #Mutations = number of weights and biases selected and chose (e.g mutation val 2 = 2 weights and biases)
+        mutations = (self.mutation_rate * np.arange(1, self.population_size)**2 / 5).astype(int)
+        self.mutate_genomes(children, mutations)
+
+        #Reset vehicles
+        for vehicle in self.vehicles[1:]:
             vehicle.reset_vehicle(*self._pos.get_pos())
             vehicle.alive = True
 
         self.fitnesses = PriorityQueue(self.population_size)
-        
+
+    #Apply random mutations to the given genomes
+    #   indices : the genome rows to mutate
+    #   mutations : number of mutations applied to each row
+    #each mutation gets a random layer, then sets a random weight and bias of that layer to a new random value
+    #   rather than applying mutations one by one, each value is replaced with the chance it is picked by any of the mutations
+    def mutate_genomes(self, indices, mutations):
+        #chance of being picked at least once = 1 - (1 - chance per mutation) ^ mutations
+        chances = -np.expm1(np.outer(mutations, np.log1p(-self.mutation_probabilities)))
+        mutated = np.random.rand(*chances.shape) < chances
+
+        genomes = self.genomes[indices]
+        genomes[mutated] = np.random.rand(np.count_nonzero(mutated)) - 0.5
+        self.genomes[indices] = genomes
+
 
     #Add vehicle to fitness queue
     def add_fitness(self, vehicle, fitness):
@@ -1317,11 +1678,14 @@ Ray object
 
 Used to cast a ray in a given direction
     collision checks only appy to track objects (for now)
+    with a track geometry, pieces whose bounding box the ray does not reach are skipped before checking their sides
 
 Parameters:
     direction : the direction the ray will travel (vector)
 
 Methods:
+    set_ray_length(ray_length) : sets how far the ray reaches
+    get_nearby_pieces() : returns the track pieces whose bounding box the ray passes through
     track_collision_check(track_piece) : performs a collision check with the given track and returns the points of intersection
     intersect(vec_pos, ved_dir) : returns the point of intersection with the given vector line positon and direction
 '''
@@ -1331,6 +1695,9 @@ class Ray(SimulationObject):
         self.direction = direction #Direction (vector) of ray's travel
         self._end_pos = self._pos + 100 * self.direction.normalised()
         self.track_pieces = []
+        self.track_geometry = None #Precomputed segments of the track pieces, optional
+        self.ray_length = None #How far the ray reaches, None for no limit
+        self._piece_indices = np.zeros(0, dtype=int) #Index of each of "track_pieces" in the track geometry
 
 
     #Sets the direction of the direction attribute
@@ -1374,11 +1741,38 @@ class Ray(SimulationObject):
         for piece in multiple_pieces:
             self.track_pieces.append(piece)
 
+        if self.track_geometry != None:
+            self._piece_indices = np.array([self.track_geometry.get_piece_index(piece) for piece in self.track_pieces], dtype=int)
+
+    #Use the precomputed world space segments of a track for collision checks
+    #   track_geometry : TrackGeometry object containing every piece in "track_pieces"
+    def set_track_geometry(self, track_geometry):
+        self.track_geometry = track_geometry
+        self._piece_indices = np.array([track_geometry.get_piece_index(piece) for piece in self.track_pieces], dtype=int)
+
+    #Sets how far the ray reaches, pieces further away are not checked
+    #   intersections on a piece within reach may still be further than the ray length
+    #   ray_length : distance from the ray's position, None for no limit
+    def set_ray_length(self, ray_length):
+        self.ray_length = ray_length
+
+    #Returns the track pieces whose bounding box the ray passes through
+    #   uses the piece bounds of the track geometry, every piece is returned without one
+    def get_nearby_pieces(self):
+        if self.track_geometry == None or self.direction.get_mag() == 0:
+            return self.track_pieces
+
+        _ray_length = self.ray_length if self.ray_length != None else math.inf
+        _mask = self.track_geometry.ray_piece_mask(self._pos.get_pos(), self.direction.normalised().get_pos(), _ray_length, self._piece_indices)
+
+        return [self.track_pieces[piece_i] for piece_i in np.flatnonzero(_mask)]
+
     #Returns all the collision points with all track pieces for ray
+    #   only pieces the ray reaches are checked for intersections
     def tracks_collision_check(self):
         out = []
 
-        for piece in self.track_pieces:
+        for piece in self.get_nearby_pieces():
             points = self.track_collision_check(piece)
             if len(points) != 0 :
                 out.append(points)
@@ -1388,6 +1782,10 @@ class Ray(SimulationObject):
     #Check for collision with a given track piece
     #   track_piece : piece to check for collision with this ray
     def track_collision_check(self, track_piece):
+        #Use the precomputed segments when the track geometry has been given
+        if self.track_geometry != None:
+            return [Vector(x, y) for x, y in self.track_geometry.ray_intersections(self._pos.get_pos(), self.direction.get_pos(), track_piece)]
+
         _intersection_points = []
 
         #Loop through all sides of example piece
@@ -1512,6 +1910,12 @@ class TrackPiece(SimulationObject):
     def get_end_pos(self):
         return self._pos + self.end_pos
 
+    #Returns the sides of the piece which are exact circular arcs
+    #   straight pieces have none, their sides are only line segments
+    #returns a list of (centre, radius, start direction, end direction) in world space
+    def get_arcs(self):
+        return []
+
     def get_centre(self):
         x_pos = 0
         y_pos = 0
@@ -1574,6 +1978,36 @@ class TrackPiece(SimulationObject):
 
         return False
 
+    #Returns which of the points are inside the track, the batched version of "collision_point"
+    #   xs : numpy array of x coordinates
+    #   ys : numpy array of y coordinates, same shape as xs
+    #returns a boolean array of the same shape
+    def collision_points(self, xs, ys):
+        _top_bottom = (self.bottom_right - self.top_left).sign()
+        _top_left = (self.top_left + self._pos).int() - _top_bottom
+        _bottom_right = (self.bottom_right + self._pos).int() - _top_bottom
+
+        #Multiply by "top bottom" to flip the inequality for when the top left is greater than the bottom right
+        _inside_x = (_top_left.x*_top_bottom.x <= xs*_top_bottom.x) & (xs*_top_bottom.x <= _bottom_right.x*_top_bottom.x)
+        _inside_y = (_top_left.y*_top_bottom.y <= ys*_top_bottom.y) & (ys*_top_bottom.y <= _bottom_right.y*_top_bottom.y)
+
+        return _inside_x & _inside_y
+
+    #Returns the occupancy bitmap of the piece on a grid of nodes
+    #   node_size : spacing between grid points
+    #the grid starts at the top left of the piece's bounding box and steps towards the bottom right
+    #returns (xs, ys, occupancy) where occupancy[row][column] is true if (xs[column], ys[row]) is inside the track
+    def get_occupancy(self, node_size):
+        _top_bottom = (self.bottom_right - self.top_left).sign()
+        _top_left = (self.top_left + self._pos).int() - _top_bottom
+        _bottom_right = (self.bottom_right + self._pos).int() - _top_bottom
+
+        xs = np.arange(_top_left.x, _bottom_right.x, _top_bottom.x * node_size)
+        ys = np.arange(_top_left.y, _bottom_right.y, _top_bottom.y * node_size)
+        grid_x, grid_y = np.meshgrid(xs, ys)
+
+        return xs, ys, self.collision_points(grid_x, grid_y)
+
     
 '''
 Straight Piece class
@@ -1689,6 +2123,36 @@ class CurvePieceRight(TrackPiece):
         else:
             return False
 
+    #Returns which of the points lie within the track arcs, the batched version of "collision_point"
+    def collision_points(self, xs, ys):
+        _top_bottom = (self.bottom_right - self.top_left).sign()
+        _top_left = (self.top_left + self._pos).int() - _top_bottom
+        _bottom_right = (self.bottom_right + self._pos).int() - _top_bottom 
+        _bottom_left = (self.bottom_left + self._pos).int()
+
+        #Get the distance away from the origin of the arc
+        _dist = np.sqrt((xs - _bottom_left.x)**2 + (ys - _bottom_left.y)**2)
+
+        _inside_x = (_top_left.x*_top_bottom.x <= xs*_top_bottom.x) & (xs*_top_bottom.x <= _bottom_right.x*_top_bottom.x)
+
+        return _inside_x & (300 - 100 <= _dist) & (_dist <= 300)
+
+    #Returns the two sides of the piece as arcs around the bottom left corner
+    #   the arcs are the circles "collision_point" tests against, radius 300 and 200
+    #   each side's first and last vectors lie on its arc, so the arc is found from the current orientation
+    #returns a list of (centre, radius, start direction, end direction) in world space
+    #   the directions are unit vectors from the centre to the ends of the quarter turn
+    def get_arcs(self):
+        _centre = self.bottom_left + self._pos
+        out = []
+
+        for side in self.sides:
+            _start = side[0] - self.bottom_left
+            _end = side[-1] - self.bottom_left
+            out.append((_centre, _start.get_mag(), _start.normalised(), _end.normalised()))
+
+        return out
+
 
     # def draw(self):
     #     super().draw()
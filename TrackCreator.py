@@ -1,5 +1,6 @@
 
 from SimulationObjects import StraightLinePiece, CurvePieceLeft, CurvePieceRight, EndPiece, StartPiece, SimulationObject
+from TrackGeometry import TrackGeometry
 from CustomStructures import *
 from FileHandlers import *
 import pygame 
@@ -15,6 +16,7 @@ class TrackCreator(SimulationObject):
 
         self.track_pieces = Stack(-1) #Track OBJECTS in simulation
         self.track_structure = Stack(-1) #Track COMPONENTS (((x, y), direction, track type)) in simulation
+        self.track_geometry = None #Precomputed geometry of the track, built when a whole track is set
 
         self.surface = surface
         self.camera = camera
@@ -56,6 +58,7 @@ class TrackCreator(SimulationObject):
     #   track_type : the object type
     #Creates piece object and adds it to piece stack
     def add_structure(self, pos, direction, track_type):
+        self.track_geometry = None #Geometry no longer matches the track
         structure = (pos, direction, track_type)
         self.track_structure.push(structure)
 
@@ -87,6 +90,9 @@ class TrackCreator(SimulationObject):
         for structure in track_structure:
             self.add_structure(*structure)
 
+        #Track is complete, so build its geometry once
+        self.track_geometry = TrackGeometry(self.track_pieces.get_list())
+
 
     #Place a piece on the end of the track
     #   piece_name : the (string) name of the track object
@@ -135,6 +141,7 @@ class TrackCreator(SimulationObject):
     def undo_piece(self):
         piece = self.track_pieces.pop()
         piece_structure = self.track_structure.pop()
+        self.track_geometry = None
 
         self.layer.remove_objects(tags=piece.tags)
         return piece
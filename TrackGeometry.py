@@ -0,0 +1,749 @@
+from FileHandlers import TrackCache
+import numpy as np
+import math
+
+'''
+Track geometry functions
+Used to perform collision queries against every track piece at once with numpy arrays
+    a segment is one straight edge of a track piece's side
+    segments are stored in world space as rows of [start x, start y, direction x, direction y]
+    an arc is a side which is an exact quarter circle, the sides of curved pieces
+    arcs are stored in world space as rows of [centre x, centre y, radius, start x, start y, end x, end y]
+        start and end are unit directions from the centre, every point on the arc is within 90 degrees of both
+'''
+
+'''
+Track geometry class
+World space geometry of a track, built once when a track is loaded
+    the track is static during a simulation so the arrays are never rebuilt
+
+Parameters:
+    track_pieces : list of track piece objects
+    cell_size : the cell size of the segment grid (pixels)
+
+Attributes:
+    segment_starts : (segments x 2) array of segment start points, sides which are arcs have no segments
+    segment_directions : (segments x 2) array of segment directions (end - start)
+    segment_pieces : index of the piece each segment belongs to
+    segments : (segments x 4) array of [start, direction], used for ray casting
+    piece_bounds : (pieces x 4) array of piece bounding boxes [min x, min y, max x, max y]
+    piece_segments : (pieces x 2) array of the first and last+1 segment index of each piece
+    arcs : (arcs x 7) array of [centre, radius, start direction, end direction], used for ray casting
+    arc_pieces : index of the piece each arc belongs to
+    piece_arcs : (pieces x 2) array of the first and last+1 arc index of each piece
+    segment_grid : uniform grid of the segments and arcs, used for ray queries
+    centreline_starts, centreline_ends : (pieces x 2) arrays of where the centreline enters and leaves each piece
+    centreline_centres : (pieces x 2) array of the centre of each curved piece's arc, NaN for straight pieces
+    centreline_lengths : length of the centreline through each piece
+    centreline_offsets : length of the centreline before each piece (pieces+1 values, the last is the track length)
+    distance_fields : distance fields which have been created, by (resolution, maximum distance)
+
+Methods:
+    get_piece_index(piece) : returns the index of a track piece object
+    is_on_track(point) : returns true if a point is inside any track piece
+    get_progress(piece_index, point) : returns the distance along the centreline of a point on a piece
+    get_distance_field(resolution, max_distance) : returns the signed distance field of the track, created once per track
+    cast_rays(origins, directions, ray_length) : casts a batch of rays against the segments and arcs using the segment grid
+    ray_piece_mask(origin, direction, ray_length, piece_indices) : returns which pieces' bounding boxes a ray passes through
+    ray_intersections(origin, direction, piece) : returns the points a ray intersects the sides of a piece
+'''
+class TrackGeometry:
+    def __init__(self, track_pieces, cell_size=100):
+        self.track_pieces = list(track_pieces)
+        self.piece_indices = {} #track piece object : index
+
+        starts = []
+        directions = []
+        segment_pieces = []
+        arcs = []
+        arc_pieces = []
+        self.piece_bounds = np.zeros((len(self.track_pieces), 4))
+        self.piece_segments = np.zeros((len(self.track_pieces), 2), dtype=int)
+        self.piece_arcs = np.zeros((len(self.track_pieces), 2), dtype=int)
+        self.centreline_starts = np.zeros((len(self.track_pieces), 2))
+        self.centreline_ends = np.zeros((len(self.track_pieces), 2))
+        self.centreline_centres = np.full((len(self.track_pieces), 2), np.nan)
+        self.centreline_lengths = np.zeros(len(self.track_pieces))
+
+        for piece_i in range(0, len(self.track_pieces)):
+            piece = self.track_pieces[piece_i]
+            _pos = piece.get_pos()
+            self.piece_indices[piece] = piece_i
+            self.piece_segments[piece_i, 0] = len(starts)
+            self.piece_arcs[piece_i, 0] = len(arcs)
+
+            #Pieces with arcs use them in place of the polyline drawn for their sides
+            _arcs = piece.get_arcs()
+            for centre, radius, start, end in _arcs:
+                arcs.append((centre.x, centre.y, radius, start.x, start.y, end.x, end.y))
+                arc_pieces.append(piece_i)
+
+            #Each pair of consecutive vectors on a side is a segment
+            for side in (piece.sides if len(_arcs) == 0 else []):
+                for vec_i in range(0, len(side)-1):
+                    starts.append((side[vec_i].x + _pos.x, side[vec_i].y + _pos.y))
+                    directions.append((side[vec_i+1].x - side[vec_i].x, side[vec_i+1].y - side[vec_i].y))
+                    segment_pieces.append(piece_i)
+
+            self.piece_segments[piece_i, 1] = len(starts)
+            self.piece_arcs[piece_i, 1] = len(arcs)
+
+            #Bounding box from the piece's corners, the corners can be in any order once rotated
+            corners = np.array([(piece.top_left + _pos).get_pos(), (piece.bottom_right + _pos).get_pos()])
+            self.piece_bounds[piece_i] = (*corners.min(axis=0), *corners.max(axis=0))
+
+            #Centreline from the piece's position to its end position
+            #   curves turn a quarter circle around their bottom left corner
+            self.centreline_starts[piece_i] = _pos.get_pos()
+            self.centreline_ends[piece_i] = piece.get_end_pos().get_pos()
+            if piece.has_tags(["curve-right"]) or piece.has_tags(["curve-left"]):
+                self.centreline_centres[piece_i] = (piece.bottom_left + _pos).get_pos()
+                self.centreline_lengths[piece_i] = math.pi/2 * np.linalg.norm(self.centreline_starts[piece_i] - self.centreline_centres[piece_i])
+            else:
+                self.centreline_lengths[piece_i] = np.linalg.norm(self.centreline_ends[piece_i] - self.centreline_starts[piece_i])
+
+        self.segment_starts = np.array(starts, dtype=float).reshape(-1, 2)
+        self.segment_directions = np.array(directions, dtype=float).reshape(-1, 2)
+        self.segment_pieces = np.array(segment_pieces, dtype=int)
+        self.segments = np.hstack((self.segment_starts, self.segment_directions))
+        self.arcs = np.array(arcs, dtype=float).reshape(-1, 7)
+        self.arc_pieces = np.array(arc_pieces, dtype=int)
+
+        self.segment_grid = SegmentGrid(self.segments, cell_size, self.arcs)
+
+        self.centreline_offsets = np.concatenate(([0], np.cumsum(self.centreline_lengths)))
+        self.distance_fields = {}
+
+        #Centreline of each piece as python floats, progress is found for one vehicle at a time
+        #   (start x, start y, end x, end y, centre x, centre y, length, offset)
+        self._centrelines = np.column_stack((self.centreline_starts, self.centreline_ends, self.centreline_centres, self.centreline_lengths, self.centreline_offsets[:-1])).tolist()
+
+    #Returns the index of the given track piece object
+    def get_piece_index(self, piece):
+        return self.piece_indices[piece]
+
+    #Returns true if a point is inside any track piece
+    #   only the pieces whose bounding boxes contain the point are checked exactly
+    #   bounding boxes are padded by two pixels, piece collisions round their corners to whole pixels
+    #   point : vector position
+    def is_on_track(self, point):
+        _x, _y = point.get_pos()
+        _bounds = self.piece_bounds
+        _candidates = np.flatnonzero((_bounds[:, 0] - 2 <= _x) & (_x <= _bounds[:, 2] + 2) & (_bounds[:, 1] - 2 <= _y) & (_y <= _bounds[:, 3] + 2))
+
+        for piece_i in _candidates:
+            if self.track_pieces[piece_i].collision_point(point) == True:
+                return True
+
+        return False
+
+    #Returns the distance along the track's centreline of a point on a piece
+    #   the point is projected onto the piece's centreline, so the distance is never outside the piece
+    #   piece_index : index of the piece the point is on
+    #   point : (x, y) position
+    def get_progress(self, piece_index, point):
+        start_x, start_y, end_x, end_y, centre_x, centre_y, length, offset = self._centrelines[piece_index]
+
+        #Straight pieces, fraction along the line from the start to the end
+        if math.isnan(centre_x):
+            _dx = end_x - start_x
+            _dy = end_y - start_y
+            _fraction = ((point[0] - start_x)*_dx + (point[1] - start_y)*_dy) / (_dx*_dx + _dy*_dy)
+
+        #Curved pieces, fraction of the quarter turn from the start to the point around the centre
+        else:
+            _start_x = start_x - centre_x
+            _start_y = start_y - centre_y
+            _point_x = point[0] - centre_x
+            _point_y = point[1] - centre_y
+            _end_angle = math.atan2(_start_x*(end_y - centre_y) - _start_y*(end_x - centre_x), _start_x*(end_x - centre_x) + _start_y*(end_y - centre_y))
+            _angle = math.atan2(_start_x*_point_y - _start_y*_point_x, _start_x*_point_x + _start_y*_point_y)
+            _fraction = _angle / _end_angle
+
+        return offset + min(max(_fraction, 0), 1) * length
+
+    #Returns the signed distance field of the track
+    #   fields are kept once created, and cached on disk so each track's field is only created once
+    #   resolution : spacing between the field's grid points (pixels)
+    #   max_distance : distances further than this from a side are capped
+    def get_distance_field(self, resolution, max_distance=100):
+        if (resolution, max_distance) in self.distance_fields:
+            return self.distance_fields[(resolution, max_distance)]
+
+        cache = TrackCache()
+        cache_key = cache.get_key(self.track_pieces, "Distance field", resolution, max_distance)
+        field_data = cache.load(cache_key, ("origin", "resolution", "max-distance", "distances", "inner-segments", "inner-arcs"))
+
+        if field_data == None:
+            distance_field = create_distance_field(self, resolution, max_distance)
+            cache.save(cache_key, {"origin" : distance_field.origin, "resolution" : resolution, "max-distance" : max_distance, "distances" : distance_field.distances,
+                                   "inner-segments" : distance_field.inner_segments, "inner-arcs" : distance_field.inner_arcs})
+        else:
+            distance_field = DistanceField(field_data["origin"], field_data["resolution"], field_data["max-distance"], field_data["distances"], field_data["inner-segments"], field_data["inner-arcs"])
+
+        self.distance_fields[(resolution, max_distance)] = distance_field
+        return distance_field
+
+    #Cast a batch of rays against the track
+    #   only the segments and arcs in the grid cells each ray passes through are checked
+    #   origins : (vehicles x 2) array of ray origins
+    #   directions : (vehicles x rays x 2) array of unit ray directions
+    #returns a (vehicles x rays) array of the distance to the closest side, ray_length if there is none
+    def cast_rays(self, origins, directions, ray_length):
+        directions = np.asarray(directions, dtype=float)
+
+        #Small batches are quicker to check against every segment and arc than to walk the grid
+        if directions.shape[0] * directions.shape[1] * (len(self.segments) + len(self.arcs)) <= 50000:
+            return np.minimum(cast_rays(origins, directions, self.segments, ray_length), cast_rays_arcs(origins, directions, self.arcs, ray_length))
+
+        return self.segment_grid.cast_rays(origins, directions, ray_length)
+
+    #Returns which pieces' bounding boxes a ray passes through, the broad phase before "ray_intersections"
+    #   bounding boxes are padded by a pixel, sides lie on the edges of the boxes
+    #   origin : (x, y) start of the ray
+    #   direction : (x, y) unit direction of the ray
+    #   ray_length : the ray ends this far from its origin
+    #   piece_indices : array of the indices of the pieces to check
+    #returns a boolean array, true for each piece the ray may intersect
+    def ray_piece_mask(self, origin, direction, ray_length, piece_indices):
+        bounds = self.piece_bounds[piece_indices]
+        t_enter, t_exit = ray_box_intervals(np.asarray(origin, dtype=float), np.asarray(direction, dtype=float), bounds[:, 0:2] - 1, bounds[:, 2:4] + 1)
+
+        return np.maximum(t_enter, 0) <= np.minimum(t_exit, ray_length)
+
+    #Returns the points where a ray intersects the sides of a track piece
+    #   origin : (x, y) start of the ray
+    #   direction : (x, y) direction of the ray
+    #   piece : the track piece object to check
+    #returns a list of (x, y) points in front of the ray
+    def ray_intersections(self, origin, direction, piece):
+        piece_i = self.get_piece_index(piece)
+        segments = self.segments[self.piece_segments[piece_i, 0]:self.piece_segments[piece_i, 1]]
+        arcs = self.arcs[self.piece_arcs[piece_i, 0]:self.piece_arcs[piece_i, 1]]
+
+        #Direction is normalised so the distance is the length along the ray
+        _direction = np.asarray(direction, dtype=float)
+        _mag = np.sqrt(_direction[0]**2 + _direction[1]**2)
+        if _mag == 0 or len(segments) + len(arcs) == 0:
+            return []
+        _direction = _direction / _mag
+
+        distances = np.concatenate((cast_rays([origin], [[_direction]], segments, np.inf, all_hits=True)[0, 0], cast_rays_arcs([origin], [[_direction]], arcs, np.inf, all_hits=True)[0, 0].ravel()))
+        distances = distances[np.isfinite(distances)]
+
+        return [(float(origin[0] + distance * _direction[0]), float(origin[1] + distance * _direction[1])) for distance in distances]
+
+#Create the signed distance field of a track
+#   each segment only updates the grid points within the maximum distance of it
+#   grid points are inside the track if they are inside any piece
+#   track_geometry : the "TrackGeometry" of the track
+#   resolution : spacing between grid points (pixels)
+#   max_distance : distances further than this from a side are capped
+#returns a "DistanceField"
+def create_distance_field(track_geometry, resolution, max_distance):
+    #Grid covers every piece with a border of the maximum distance
+    border = max_distance + resolution
+    origin = np.floor((track_geometry.piece_bounds[:, 0:2].min(axis=0) - border) / resolution) * resolution
+    _far = track_geometry.piece_bounds[:, 2:4].max(axis=0) + border
+    columns, rows = (np.ceil((_far - origin) / resolution)).astype(int) + 1
+
+    xs = origin[0] + np.arange(columns) * resolution
+    ys = origin[1] + np.arange(rows) * resolution
+    distances = np.full((rows, columns), float(max_distance))
+
+    #Returns the column and row slices of the grid points inside a box
+    def get_window(low, high):
+        _low = np.clip(np.floor((low - origin) / resolution).astype(int), 0, None)
+        _high = np.minimum(np.ceil((high - origin) / resolution).astype(int) + 1, (columns, rows))
+        return slice(_low[0], _high[0]), slice(_low[1], _high[1])
+
+    #Distance to the closest point on each segment
+    for segment in track_geometry.segments:
+        start = segment[0:2]
+        direction = segment[2:4]
+        window_x, window_y = get_window(np.minimum(start, start + direction) - max_distance, np.maximum(start, start + direction) + max_distance)
+        _x = xs[window_x][None, :] - start[0]
+        _y = ys[window_y][:, None] - start[1]
+
+        _length_sq = direction[0]**2 + direction[1]**2
+        _fraction = np.clip((_x*direction[0] + _y*direction[1]) / _length_sq, 0, 1) if _length_sq > 0 else 0
+        _distance = np.sqrt((_x - _fraction*direction[0])**2 + (_y - _fraction*direction[1])**2)
+        distances[window_y, window_x] = np.minimum(distances[window_y, window_x], _distance)
+
+    #Distance to the closest point on each arc
+    #   points within the arc's quarter turn are closest to the circle, others to the closer end of the arc
+    for arc in track_geometry.arcs:
+        centre = arc[0:2]
+        radius = arc[2]
+        start = arc[3:5]
+        end = arc[5:7]
+        _ends = centre + radius * np.array((start, end))
+        window_x, window_y = get_window(np.minimum(_ends.min(axis=0), centre + radius * (start + end)) - max_distance, np.maximum(_ends.max(axis=0), centre + radius * (start + end)) + max_distance)
+        _x = xs[window_x][None, :] - centre[0]
+        _y = ys[window_y][:, None] - centre[1]
+
+        _within = (_x*start[0] + _y*start[1] >= 0) & (_x*end[0] + _y*end[1] >= 0)
+        _to_ends = np.minimum(np.sqrt((_x - radius*start[0])**2 + (_y - radius*start[1])**2), np.sqrt((_x - radius*end[0])**2 + (_y - radius*end[1])**2))
+        _distance = np.where(_within, np.abs(np.sqrt(_x**2 + _y**2) - radius), _to_ends)
+        distances[window_y, window_x] = np.minimum(distances[window_y, window_x], _distance)
+
+    #Grid points inside any piece are on the track
+    inside = np.zeros((rows, columns), dtype=bool)
+    for piece_i in range(0, len(track_geometry.track_pieces)):
+        window_x, window_y = get_window(track_geometry.piece_bounds[piece_i, 0:2] - resolution, track_geometry.piece_bounds[piece_i, 2:4] + resolution)
+        grid_x, grid_y = np.meshgrid(xs[window_x], ys[window_y])
+        inside[window_y, window_x] |= track_geometry.track_pieces[piece_i].collision_points(grid_x, grid_y)
+
+    #Sides inside another piece, where pieces overlap, do not change the sign of the distance
+    #   these sides are found by checking points along them, a side is inside if the points just either side of any of them are both on the track
+    _fractions = np.linspace(0, 1, 18)[1:-1, None, None]
+    _segment_normals = np.stack((-track_geometry.segments[:, 3], track_geometry.segments[:, 2]), axis=1)
+    _segment_normals = np.broadcast_to(_segment_normals / np.maximum(np.sqrt((_segment_normals**2).sum(axis=1)), 1e-9)[:, None], (len(_fractions), *_segment_normals.shape))
+    _segment_points = track_geometry.segments[:, 0:2] + _fractions * track_geometry.segments[:, 2:4]
+
+    #Arcs turn less than half a circle, so directions between the start and end directions are along the arc
+    _arc_normals = (1 - _fractions) * track_geometry.arcs[:, 3:5] + _fractions * track_geometry.arcs[:, 5:7]
+    _arc_normals = _arc_normals / np.maximum(np.sqrt((_arc_normals**2).sum(axis=2)), 1e-9)[:, :, None]
+    _arc_points = track_geometry.arcs[:, 0:2] + track_geometry.arcs[:, 2, None] * _arc_normals
+
+    _points = np.concatenate((_segment_points, _arc_points), axis=1)
+    _normals = np.concatenate((_segment_normals, _arc_normals), axis=1)
+    _points_inside = np.ones(_points.shape[:2], dtype=bool)
+    for offset in (-2, 2):
+        _offset_points = _points + offset * _normals
+        _on_track = np.zeros(_points.shape[:2], dtype=bool)
+        for piece in track_geometry.track_pieces:
+            _on_track |= piece.collision_points(_offset_points[:, :, 0], _offset_points[:, :, 1])
+        _points_inside &= _on_track
+    _sides_inside = _points_inside.any(axis=0)
+
+    inner_segments = track_geometry.segments[_sides_inside[:len(track_geometry.segments)]]
+    inner_arcs = track_geometry.arcs[_sides_inside[len(track_geometry.segments):]]
+
+    return DistanceField(origin, resolution, max_distance, np.where(inside, distances, -distances), inner_segments, inner_arcs)
+
+'''
+Distance field class
+Signed distance from a grid of points to the closest side of the track
+    distances are positive on the track and negative off it
+    points between grid points are bilinearly interpolated, points off the grid are the maximum distance off the track
+
+Parameters:
+    origin : (x, y) world position of the first grid point
+    resolution : spacing between grid points (pixels)
+    max_distance : distances further than this from a side are capped
+    distances : (rows x columns) array of the signed distance at each grid point
+    inner_segments : (segments x 4) array of the segments inside another piece, which rays are cast against directly
+    inner_arcs : (arcs x 7) array of the arcs inside another piece, which rays are cast against directly
+
+Methods:
+    sample(points) : returns the signed distance at each of an array of points
+    sample_point(x, y) : returns the signed distance at one point
+    is_inside(x, y) : returns true if a point is on the track
+    cast_rays(origins, directions, ray_length) : casts a batch of rays by sphere tracing through the field
+'''
+class DistanceField:
+    def __init__(self, origin, resolution, max_distance, distances, inner_segments, inner_arcs):
+        self.origin = np.asarray(origin, dtype=float)
+        self.resolution = resolution
+        self.max_distance = max_distance
+        self.distances = distances
+        self.inner_segments = inner_segments
+        self.inner_arcs = inner_arcs
+        self.rows, self.columns = distances.shape
+
+        self._origin_x, self._origin_y = self.origin.tolist()
+
+    #Returns the signed distance at each point
+    #   points : (n x 2) array of positions
+    def sample(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        grid = (points - self.origin) / self.resolution
+        cells = np.floor(grid).astype(int)
+        fraction_x = grid[:, 0] - cells[:, 0]
+        fraction_y = grid[:, 1] - cells[:, 1]
+
+        on_grid = (cells[:, 0] >= 0) & (cells[:, 0] < self.columns-1) & (cells[:, 1] >= 0) & (cells[:, 1] < self.rows-1)
+        column = np.where(on_grid, cells[:, 0], 0)
+        row = np.where(on_grid, cells[:, 1], 0)
+
+        top = self.distances[row, column] * (1 - fraction_x) + self.distances[row, column+1] * fraction_x
+        bottom = self.distances[row+1, column] * (1 - fraction_x) + self.distances[row+1, column+1] * fraction_x
+
+        return np.where(on_grid, top * (1 - fraction_y) + bottom * fraction_y, -self.max_distance)
+
+    #Returns the signed distance at one point
+    def sample_point(self, x, y):
+        _x = (x - self._origin_x) / self.resolution
+        _y = (y - self._origin_y) / self.resolution
+        column = math.floor(_x)
+        row = math.floor(_y)
+
+        if column < 0 or column >= self.columns-1 or row < 0 or row >= self.rows-1:
+            return -self.max_distance
+
+        (top_left, top_right), (bottom_left, bottom_right) = self.distances[row:row+2, column:column+2].tolist()
+        fraction_x = _x - column
+        fraction_y = _y - row
+
+        return (top_left * (1 - fraction_x) + top_right * fraction_x) * (1 - fraction_y) + (bottom_left * (1 - fraction_x) + bottom_right * fraction_x) * fraction_y
+
+    #Returns true if the point is on the track
+    def is_inside(self, x, y):
+        return self.sample_point(x, y) >= 0
+
+    #Cast a batch of rays by sphere tracing through the field
+    #   each ray steps forward by the distance to the closest side, so the step cannot pass far through a side
+    #   steps are at least a grid cell, so rays which graze a side keep marching instead of stalling beside it
+    #   a ray hits a side where the signed distance changes sign from its origin, rays starting off the track hit the side they enter the track through
+    #   the hit is placed between the last two steps by linear interpolation of their distances
+    #   the error of the hit comes from the bilinear interpolation of the field, usually under a pixel and at most a few pixels at a resolution of 5
+    #   rays which graze a side by less than a grid cell may miss it or hit it, the exact distance is found by "TrackGeometry.cast_rays"
+    #   sides inside another piece are not in the field's signs, rays are cast against them directly
+    #   origins : (vehicles x 2) array of ray origins
+    #   directions : (vehicles x rays x 2) array of unit ray directions
+    #returns a (vehicles x rays) array of the distance to the closest side, ray_length if there is none
+    def cast_rays(self, origins, directions, ray_length):
+        origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+        directions = np.asarray(directions, dtype=float)
+        shape = directions.shape[:2]
+
+        #One value for each ray of each vehicle, in grid units
+        start_x = (np.repeat(origins[:, 0], shape[1]) - self._origin_x) / self.resolution
+        start_y = (np.repeat(origins[:, 1], shape[1]) - self._origin_y) / self.resolution
+        direction_x = directions[:, :, 0].ravel() / self.resolution
+        direction_y = directions[:, :, 1].ravel() / self.resolution
+        distances = self.distances.ravel()
+        columns = self.columns
+        min_step = self.resolution
+
+        #Returns the signed distance at the end of each of the rays, bilinearly interpolated
+        def sample(rays, lengths):
+            _x = start_x[rays] + lengths * direction_x[rays]
+            _y = start_y[rays] + lengths * direction_y[rays]
+            _column = np.floor(_x)
+            _row = np.floor(_y)
+            on_grid = (_column >= 0) & (_column < columns-1) & (_row >= 0) & (_row < self.rows-1)
+            index = np.where(on_grid, _row * columns + _column, 0).astype(int)
+
+            fraction_x = _x - _column
+            top = distances[index] + (distances[index+1] - distances[index]) * fraction_x
+            bottom = distances[index+columns] + (distances[index+columns+1] - distances[index+columns]) * fraction_x
+            return np.where(on_grid, top + (bottom - top) * (_y - _row), -self.max_distance)
+
+        results = np.full(len(start_x), float(ray_length))
+        active = np.arange(len(start_x)) #Rays which are still marching
+        lengths = np.zeros(len(start_x))
+        previous = sample(active, lengths)
+        side = np.where(previous >= 0, 1.0, -1.0) #Which side of the track's sides each ray starts on
+        previous = previous * side
+
+        #Every step is at least the minimum step, so every ray finishes within this many steps
+        for step in range(0, math.ceil(ray_length / min_step) + 1):
+            if len(active) == 0:
+                break
+
+            _step = np.maximum(previous, min_step)
+            _lengths = lengths + _step
+            _distances = sample(active, _lengths) * side[active]
+
+            #Rays whose distance has changed sign have crossed a side
+            hit = _distances <= 0
+            _hit_lengths = lengths[hit] + _step[hit] * previous[hit] / (previous[hit] - _distances[hit])
+            results[active[hit]] = np.minimum(_hit_lengths, ray_length)
+
+            #Rays which have not hit a side or passed their length keep marching
+            marching = (hit == False) & (_lengths < ray_length)
+            active = active[marching]
+            lengths = _lengths[marching]
+            previous = _distances[marching]
+
+        #Sides inside another piece do not change the sign of the distance, so are checked exactly
+        results = results.reshape(shape)
+        if len(self.inner_segments) + len(self.inner_arcs) > 0:
+            results = np.minimum(results, np.minimum(cast_rays(origins, directions, self.inner_segments, ray_length), cast_rays_arcs(origins, directions, self.inner_arcs, ray_length)))
+
+        return results
+
+#Returns the distances along rays where they enter and exit boxes (slab test)
+#   arguments broadcast against each other, with a last axis of 2
+#   origins : ray origins
+#   directions : ray directions
+#   lows, highs : the minimum and maximum corners of the boxes
+#returns (t_enter, t_exit), the ray misses the box where t_enter > t_exit
+#   the distances are not limited to the front of the ray
+def ray_box_intervals(origins, directions, lows, highs):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inverse = 1 / directions
+        t1 = (lows - origins) * inverse
+        t2 = (highs - origins) * inverse
+
+    #Rays parallel to an axis are either always or never between that axis' slabs
+    inside = (origins >= lows) & (origins <= highs)
+    t_low = np.where(directions == 0, np.where(inside, -np.inf, np.inf), np.minimum(t1, t2))
+    t_high = np.where(directions == 0, np.where(inside, np.inf, -np.inf), np.maximum(t1, t2))
+
+    return t_low.max(axis=-1), t_high.min(axis=-1)
+
+#Returns the unit direction of every ray of every vehicle
+#   directions : array of vehicle directions (radians)
+#   ray_count : number of rays, spread evenly across the front half of the vehicle
+#returns a (vehicles x rays x 2) array
+def ray_directions(directions, ray_count):
+    angle = np.pi / (ray_count + 1)
+    angles = (np.arange(1, ray_count+1) * angle)[None, :] - np.asarray(directions)[:, None] - np.pi/2
+
+    return np.stack((np.cos(angles), np.sin(angles)), axis=-1)
+
+#Cast a batch of rays against track segments
+#   origins : (vehicles x 2) array of ray origins
+#   directions : (vehicles x rays x 2) array of unit ray directions
+#   segments : (segments x 4) array, usually "TrackGeometry.segments"
+#   ray_length : rays do not detect segments further than this
+#   all_hits : return the distance to every segment instead of the closest (infinity when not hit)
+#returns a (vehicles x rays) array of the distance to the closest segment, ray_length if there is none
+def cast_rays(origins, directions, segments, ray_length, all_hits=False):
+    origins = np.asarray(origins, dtype=float)
+    directions = np.asarray(directions, dtype=float)
+    distances = np.full(directions.shape[:2], float(ray_length))
+
+    if all_hits == True and (len(segments) == 0 or len(origins) == 0):
+        return np.full((*directions.shape[:2], len(segments)), np.inf)
+    elif len(segments) == 0 or len(origins) == 0:
+        return distances
+
+    #Solve origin + t * direction = start + u * segment_direction for every ray and segment
+    #   uses the 2x2 determinant (cross product) of the direction vectors
+    d_x = directions[:, :, 0, None]
+    d_y = directions[:, :, 1, None]
+    offset_x = segments[None, None, :, 0] - origins[:, 0, None, None]
+    offset_y = segments[None, None, :, 1] - origins[:, 1, None, None]
+    e_x = segments[None, None, :, 2]
+    e_y = segments[None, None, :, 3]
+
+    denominator = d_x * e_y - d_y * e_x
+    parallel = np.abs(denominator) < 1e-12
+    denominator = np.where(parallel, 1, denominator)
+
+    t = (offset_x * e_y - offset_y * e_x) / denominator #distance along the ray
+    u = (offset_x * d_y - offset_y * d_x) / denominator #fraction along the segment
+
+    #Intersection must be in front of the ray and on the segment
+    hit = ~parallel & (t >= 0) & (t <= ray_length) & (u >= 0) & (u <= 1)
+
+    if all_hits == True:
+        return np.where(hit, t, np.inf)
+
+    t = np.where(hit, t, ray_length)
+
+    return np.minimum(t.min(axis=2), distances)
+
+#Cast a batch of rays against track arcs
+#   solves |origin + t * direction - centre| = radius, a quadratic in t as the directions are unit length
+#   the intersections are then clipped to the arc's quarter turn
+#   origins : (vehicles x 2) array of ray origins
+#   directions : (vehicles x rays x 2) array of unit ray directions
+#   arcs : (arcs x 7) array, usually "TrackGeometry.arcs"
+#   ray_length : rays do not detect arcs further than this
+#   all_hits : return the distance to both intersections with every arc instead of the closest (infinity when not hit)
+#returns a (vehicles x rays) array of the distance to the closest arc, ray_length if there is none
+#   or a (vehicles x rays x arcs x 2) array with all_hits
+def cast_rays_arcs(origins, directions, arcs, ray_length, all_hits=False):
+    origins = np.asarray(origins, dtype=float)
+    directions = np.asarray(directions, dtype=float)
+    distances = np.full(directions.shape[:2], float(ray_length))
+
+    if all_hits == True and (len(arcs) == 0 or len(origins) == 0):
+        return np.full((*directions.shape[:2], len(arcs), 2), np.inf)
+    elif len(arcs) == 0 or len(origins) == 0:
+        return distances
+
+    t = arc_intersections(origins[:, None, None, 0], origins[:, None, None, 1], directions[:, :, 0, None], directions[:, :, 1, None], arcs[None, None, :], ray_length)
+
+    if all_hits == True:
+        return t
+
+    return np.minimum(t.min(axis=(2, 3)), distances)
+
+#Returns the distance along each ray to its two intersections with an arc
+#   arguments broadcast against each other, arcs has a last axis of 7
+#   origin_x, origin_y : ray origins
+#   direction_x, direction_y : unit ray directions
+#returns an array with a last axis of 2 (nearer and further intersection), infinity where there is no hit
+def arc_intersections(origin_x, origin_y, direction_x, direction_y, arcs, ray_length):
+    _x = origin_x - arcs[..., 0]
+    _y = origin_y - arcs[..., 1]
+    _radius = arcs[..., 2]
+
+    #t^2 + 2bt + c = 0
+    b = direction_x * _x + direction_y * _y
+    c = _x**2 + _y**2 - _radius**2
+    discriminant = b**2 - c
+    _root = np.sqrt(np.maximum(discriminant, 0))
+    t = np.stack((-b - _root, -b + _root), axis=-1)
+
+    #Intersection must be in front of the ray and within the arc's quarter turn
+    hit_x = _x[..., None] + t * direction_x[..., None]
+    hit_y = _y[..., None] + t * direction_y[..., None]
+    within = (hit_x * arcs[..., 3, None] + hit_y * arcs[..., 4, None] >= 0) & (hit_x * arcs[..., 5, None] + hit_y * arcs[..., 6, None] >= 0)
+    hit = (discriminant >= 0)[..., None] & (t >= 0) & (t <= ray_length) & within
+
+    return np.where(hit, t, np.inf)
+
+
+'''
+Segment grid class
+Uniform grid over the track segments and arcs
+    each cell stores every segment and arc whose bounding box overlaps the cell
+    arcs are stored after the segments, arc i is item len(segments) + i
+    rays walk through the cells they pass (a DDA walk) so only nearby segments and arcs are checked
+
+Parameters:
+    segments : (segments x 4) array of [start, direction]
+    cell_size : width and height of each cell (pixels)
+    arcs : (arcs x 7) array of [centre, radius, start direction, end direction], optional
+
+Methods:
+    cast_rays(origins, directions, ray_length) : casts a batch of rays, checking only the cells they pass through
+'''
+class SegmentGrid:
+    def __init__(self, segments, cell_size, arcs=np.zeros((0, 7))):
+        self.segments = segments
+        self.arcs = arcs
+        self.cell_size = cell_size
+
+        ends = segments[:, 0:2] + segments[:, 2:4]
+
+        #A quarter arc lies in the triangle of its two ends and where their tangents meet
+        _centres = arcs[:, 0:2]
+        _radii = arcs[:, 2, None]
+        _corners = np.stack((_centres + _radii * arcs[:, 3:5], _centres + _radii * arcs[:, 5:7], _centres + _radii * (arcs[:, 3:5] + arcs[:, 5:7])))
+
+        lows = np.concatenate((np.minimum(segments[:, 0:2], ends), _corners.min(axis=0)))
+        highs = np.concatenate((np.maximum(segments[:, 0:2], ends), _corners.max(axis=0)))
+
+        #Grid covers every segment and arc with a one cell border
+        if len(lows) > 0:
+            self.origin = np.floor(lows.min(axis=0) / cell_size) * cell_size - cell_size
+            _far = np.floor(highs.max(axis=0) / cell_size) * cell_size + 2 * cell_size
+        else:
+            self.origin = np.zeros(2)
+            _far = np.full(2, cell_size)
+        self.shape = ((_far - self.origin) / cell_size).round().astype(int) #(columns, rows)
+
+        #Add each segment and arc to every cell its bounding box overlaps
+        cells = [[] for i in range(self.shape[0] * self.shape[1])]
+        low_cells = np.floor((lows - self.origin) / cell_size).astype(int)
+        high_cells = np.floor((highs - self.origin) / cell_size).astype(int)
+
+        for item_i in range(0, len(lows)):
+            for x in range(low_cells[item_i, 0], high_cells[item_i, 0]+1):
+                for y in range(low_cells[item_i, 1], high_cells[item_i, 1]+1):
+                    cells[x * self.shape[1] + y].append(item_i)
+
+        #Flatten the cell lists, segments of cell i are cell_segments[cell_starts[i]:cell_starts[i+1]]
+        self.cell_starts = np.zeros(len(cells)+1, dtype=int)
+        self.cell_starts[1:] = np.cumsum([len(cell) for cell in cells])
+        self.cell_segments = np.array([segment_i for cell in cells for segment_i in cell], dtype=int)
+
+    #Returns the (cell entry, item index) pairs of every segment and arc in the given cells
+    #   cell entry is the index of the cell in the "cells" array
+    def _gather(self, cells):
+        counts = self.cell_starts[cells+1] - self.cell_starts[cells]
+        entries = np.repeat(np.arange(len(cells)), counts)
+
+        #Position of each pair inside its cell's segment list
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return entries, self.cell_segments[np.repeat(self.cell_starts[cells], counts) + within]
+
+    #Returns the cells passed through by each ray, walking the grid one cell at a time
+    #   all rays are stepped together, one cell per loop
+    #returns a (rays x steps) array of flattened cell indices, -1 where the ray has ended
+    def _walk_rays(self, origins, directions, ray_length):
+        low = self.origin
+        high = self.origin + self.shape * self.cell_size
+
+        #Find where each ray enters and exits the grid
+        t_enter, t_exit = ray_box_intervals(origins, directions, low, high)
+        t_enter = np.maximum(t_enter, 0)
+        t_exit = np.minimum(t_exit, ray_length)
+        active = t_enter <= t_exit
+
+        #Starting cell and the distance to the next cell boundary on each axis
+        start = origins + np.where(np.isfinite(t_enter), t_enter, 0)[:, None] * directions
+        cell = np.floor((start - low) / self.cell_size).astype(int)
+        cell = np.clip(cell, 0, self.shape - 1)
+
+        step = np.sign(directions).astype(int)
+        boundary = low + (cell + (step > 0)) * self.cell_size
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_max = np.where(step != 0, (boundary - origins) / directions, np.inf)
+            t_delta = np.where(step != 0, self.cell_size / np.abs(directions), np.inf)
+
+        #A ray of unit direction passes through at most (|dx| + |dy|) * length / cell_size + 2 cells
+        steps = int(np.ceil(np.sqrt(2) * min(ray_length, self.cell_size * self.shape.sum()) / self.cell_size)) + 2
+        cells = np.full((len(origins), steps), -1, dtype=int)
+
+        for step_i in range(0, steps):
+            cells[active, step_i] = cell[active, 0] * self.shape[1] + cell[active, 1]
+
+            #Move to the next cell along the axis with the closest boundary
+            axis = np.argmin(t_max, axis=1)
+            rows = np.arange(len(origins))
+            t_next = t_max[rows, axis]
+            cell[rows, axis] += step[rows, axis]
+            t_max[rows, axis] += t_delta[rows, axis]
+
+            active &= (t_next <= t_exit) & (cell >= 0).all(axis=1) & (cell < self.shape).all(axis=1)
+
+        return cells
+
+    #Cast a batch of rays, only checking the segments and arcs in the cells each ray passes through
+    #   origins : (vehicles x 2) array of ray origins
+    #   directions : (vehicles x rays x 2) array of unit ray directions
+    #returns a (vehicles x rays) array of the distance to the closest side, ray_length if there is none
+    def cast_rays(self, origins, directions, ray_length):
+        origins = np.asarray(origins, dtype=float)
+        directions = np.asarray(directions, dtype=float)
+        shape = directions.shape[:2]
+        distances = np.full(shape[0] * shape[1], float(ray_length))
+
+        if len(self.segments) + len(self.arcs) == 0 or len(origins) == 0:
+            return distances.reshape(shape)
+
+        #Every ray of a vehicle starts at the vehicle's position
+        _origins = np.repeat(origins, shape[1], axis=0)
+        _directions = directions.reshape(-1, 2)
+
+        #Pair each ray with the segments and arcs of each cell it passes through
+        cells = self._walk_rays(_origins, _directions, ray_length)
+        rays, steps = np.nonzero(cells >= 0)
+        entries, item_ids = self._gather(cells[rays, steps])
+        rays = rays[entries]
+
+        #Arcs are stored after the segments
+        is_arc = item_ids >= len(self.segments)
+        arc_rays = rays[is_arc]
+        arc_ids = item_ids[is_arc] - len(self.segments)
+        rays = rays[~is_arc]
+        segment_ids = item_ids[~is_arc]
+
+        t = arc_intersections(_origins[arc_rays, 0], _origins[arc_rays, 1], _directions[arc_rays, 0], _directions[arc_rays, 1], self.arcs[arc_ids], ray_length).min(axis=1)
+        np.minimum.at(distances, arc_rays, t)
+
+        #Solve the intersection of each ray and segment pair
+        d = _directions[rays]
+        offset = self.segments[segment_ids, 0:2] - _origins[rays]
+        e = self.segments[segment_ids, 2:4]
+
+        denominator = d[:, 0] * e[:, 1] - d[:, 1] * e[:, 0]
+        parallel = np.abs(denominator) < 1e-12
+        denominator = np.where(parallel, 1, denominator)
+
+        t = (offset[:, 0] * e[:, 1] - offset[:, 1] * e[:, 0]) / denominator #distance along the ray
+        u = (offset[:, 0] * d[:, 1] - offset[:, 1] * d[:, 0]) / denominator #fraction along the segment
+
+        hit = ~parallel & (t >= 0) & (t <= ray_length) & (u >= 0) & (u <= 1)
+        np.minimum.at(distances, rays[hit], t[hit])
+
+        return distances.reshape(shape)
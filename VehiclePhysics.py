@@ -0,0 +1,150 @@
+import numpy as np
+
+'''
+Vehicle physics class
+Stores the state of a group of vehicles in contiguous arrays and advances every vehicle in one step
+    each vehicle is given a slot index, "Vehicle" objects read and write their state through this index
+
+Parameters:
+    max_size : the number of vehicle slots
+
+Attributes (each array is indexed by vehicle slot):
+    pos : (max_size, 2) array of positions
+    velocity : (max_size, 2) array of velocities (pixels/second)
+    direction : heading of each vehicle (radians)
+    turn_state : 1 = left, 0 = none, -1 = right
+    state_move : set to true to accelerate the vehicle
+    alive : vehicles which are not alive are not stepped
+    time_active, distance_travelled, errors_made : results of each vehicle
+    piece_index : index of the track piece each vehicle has reached, pieces are in the order they are driven
+    progress : distance along the track's centreline each vehicle reached, set when the vehicle is killed
+
+Methods:
+    add_vehicle(xpos, ypos, frame_period, physics_settings) : assigns a slot to a vehicle, returns the slot index
+    reset_vehicle(index, xpos, ypos, errors_made) : resets the state of a vehicle slot
+    get_results(index) : returns the results dictionary of a vehicle slot
+    set_results(index, results) : sets the results of a vehicle slot from a results dictionary
+    step() : advances every alive vehicle by one frame
+'''
+class VehiclePhysics:
+    #Turn state names to their turn_state array value
+    TURN_STATES = {"left" : 1, "none" : 0, "right" : -1}
+    TURN_NAMES = {1 : "left", 0 : "none", -1 : "right"}
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0 #Number of slots in use
+
+        self.pos = np.zeros((max_size, 2))
+        self.velocity = np.zeros((max_size, 2))
+        self.direction = np.zeros(max_size)
+        self.turn_state = np.zeros(max_size, dtype=np.int8)
+        self.state_move = np.zeros(max_size, dtype=bool)
+        self.alive = np.zeros(max_size, dtype=bool)
+
+        #Physics settings of each vehicle
+        self.frame_period = np.zeros(max_size)
+        self.maximum_velocity = np.zeros(max_size)
+        self.acceleration_mag = np.zeros(max_size)
+        self.drag_factor = np.zeros(max_size)
+        self.turn_speed = np.zeros(max_size)
+
+        #Results of each vehicle
+        self.time_active = np.zeros(max_size)
+        self.distance_travelled = np.zeros(max_size)
+        self.errors_made = np.zeros(max_size)
+
+        #Progress of each vehicle along the track
+        self.piece_index = np.zeros(max_size, dtype=int)
+        self.progress = np.zeros(max_size)
+
+    #Assign the next free slot to a vehicle
+    #   frame_period : seconds per frame for the vehicle
+    #   physics_settings : the simulation's physics settings dictionary
+    #returns the slot index
+    def add_vehicle(self, xpos, ypos, frame_period, physics_settings):
+        if self.size >= self.max_size:
+            raise Exception("Error. Cannot add vehicle; vehicle physics is full")
+
+        index = self.size
+        self.size += 1
+
+        self.frame_period[index] = frame_period
+        self.maximum_velocity[index] = physics_settings["maximum-velocity"] #Caps the velocity's magnitude to this value (pixels/second)
+        self.acceleration_mag[index] = physics_settings["acceleration-magnitude"] #pixels/second/second , applied when moving
+        self.drag_factor[index] = physics_settings["deceleration-magnitude"]/100 #Drag for when not moving, values closer to 1 means quicker deacceleration
+        self.turn_speed[index] = physics_settings["turn-velocity"] #radian per second turn speed
+
+        self.reset_vehicle(index, xpos, ypos, 0)
+        return index
+
+    #Reset the state and results of a vehicle slot
+    def reset_vehicle(self, index, xpos, ypos, errors_made):
+        self.pos[index] = (xpos, ypos)
+        self.velocity[index] = 0
+        self.direction[index] = 0
+        self.turn_state[index] = 0
+        self.state_move[index] = False
+        self.alive[index] = True
+
+        self.time_active[index] = 0
+        self.distance_travelled[index] = 0
+        self.errors_made[index] = errors_made
+
+        self.piece_index[index] = 0
+        self.progress[index] = 0
+
+    #Returns the results dictionary of a vehicle slot
+    def get_results(self, index):
+        return {
+            "time-active" : float(self.time_active[index]), #Time spent active
+            "distance-travelled" : float(self.distance_travelled[index]), #Total distance (not displacement) travelled
+            "errors-made" : float(self.errors_made[index]), #How long spent off-road, distance from end
+            "progress" : float(self.progress[index]), #Distance along the track's centreline reached
+        }
+
+    #Sets the results of a vehicle slot from a results dictionary
+    #   used when a vehicle was simulated elsewhere (e.g a worker process)
+    def set_results(self, index, results):
+        self.time_active[index] = results["time-active"]
+        self.distance_travelled[index] = results["distance-travelled"]
+        self.errors_made[index] = results["errors-made"]
+        self.progress[index] = results["progress"]
+
+    #Advance every alive vehicle by one frame
+    #   acceleration, velocity cap, drag, position and turn are applied to all vehicles at once
+    def step(self):
+        size = self.size
+        alive = self.alive[:size]
+        dt = self.frame_period[:size]
+        velocity = self.velocity[:size]
+        direction = self.direction[:size]
+
+        self.time_active[:size] += dt * alive #time active in seconds (includes decimals)
+
+        speed = np.sqrt(velocity[:, 0]**2 + velocity[:, 1]**2)
+        moving = alive & self.state_move[:size]
+
+        #Apply acceleration to moving vehicles below the maximum velocity
+        accelerate = moving & (speed < self.maximum_velocity[:size])
+        acceleration = self.acceleration_mag[:size] * dt
+        velocity[accelerate, 0] += (acceleration * np.cos(direction))[accelerate]
+        velocity[accelerate, 1] -= (acceleration * np.sin(direction))[accelerate]
+
+        #Cap the velocity of moving vehicles at the maximum velocity
+        #   capped vehicles always have a speed greater than 0
+        cap = moving & ~accelerate
+        velocity[cap] *= ((self.maximum_velocity[:size] - 1) / np.where(cap, speed, 1))[cap, None]
+
+        #Apply drag to vehicles which are not moving
+        #   speeds below 1 are rounded down to stationary
+        drag = alive & ~self.state_move[:size]
+        velocity[drag & (speed >= 1)] *= self.drag_factor[:size][drag & (speed >= 1), None]
+        velocity[drag & (speed < 1)] = 0
+
+        #Move vehicles
+        self.pos[:size] += (dt * alive)[:, None] * velocity
+        self.distance_travelled[:size] += dt * alive * np.sqrt(velocity[:, 0]**2 + velocity[:, 1]**2) #distance = speed * time
+
+        #Turn left or right
+        direction += dt * self.turn_speed[:size] * self.turn_state[:size] * alive